@@ -1,53 +1,413 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, send_from_directory
 from flask_cors import CORS
+from flask_sock import Sock
+from simple_websocket import ConnectionClosed
+from werkzeug.exceptions import RequestEntityTooLarge
 import cv2
 import numpy as np
 import base64
-from ultralytics import YOLO
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from backends import BACKENDS, load_model
+from batching import MicroBatcher
+from postprocess import Detections, predict_kwargs
+from slicing import SLICE_MODES, SlicedDetector
+from video_detect import VideoDetector
+
+# Parse command line arguments
+parser = argparse.ArgumentParser(description='E-Waste Detection API')
+parser.add_argument('--model', type=str, default='public/models/best.pt', help='Path to the YOLO model')
+parser.add_argument('--backend', type=str, default='pytorch', choices=list(BACKENDS),
+                    help='Run the model with PyTorch, or exported to ONNX Runtime or OpenVINO')
+parser.add_argument('--no-backend-check', action='store_true',
+                    help='Skip comparing an exported model\'s outputs with PyTorch at startup')
+parser.add_argument('--conf', type=float, default=0.25, help='Confidence threshold')
+parser.add_argument('--classes', type=str, nargs='+', help='Only report these class names or ids')
+parser.add_argument('--max-det', type=int, default=300, help='Maximum detections per image')
+parser.add_argument('--batch-size', type=int, default=8, help='Maximum number of images per forward pass')
+parser.add_argument('--batch-wait-ms', type=float, default=10, help='Maximum time to wait for a batch to fill')
+parser.add_argument('--slice', type=str, default='off', choices=SLICE_MODES,
+                    help='Default sliced inference mode of /api/detect: whole image, tiles only, or full frame + tiles')
+parser.add_argument('--tile-size', type=int, default=640, help='Tile size in pixels for sliced inference')
+parser.add_argument('--tile-overlap', type=float, default=0.2, help='Overlap between neighbouring tiles, as a fraction')
+parser.add_argument('--slice-workers', type=int, default=1, help='Tile batches submitted concurrently')
+parser.add_argument('--batch-max-images', type=int, default=32, help='Maximum images per /api/detect/batch request')
+parser.add_argument('--batch-max-mb', type=float, default=64, help='Maximum upload size of a /api/detect/batch request')
+parser.add_argument('--decode-workers', type=int, default=4, help='Threads decoding /api/detect/batch images')
+parser.add_argument('--video-max-mb', type=float, default=2048, help='Maximum upload size of /api/detect/video')
+parser.add_argument('--video-output-dir', type=str, default='video_outputs',
+                    help='Where annotated videos from /api/detect/video are kept')
+parser.add_argument('--video-output-max-age', type=float, default=24,
+                    help='Hours an annotated video is kept for download before it is deleted')
+args = parser.parse_args()
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
+sock = Sock(app)
 
 # Load the YOLO model
-model = YOLO('public/models/best.pt')
+model = load_model(args.model, args.backend, check=not args.no_backend_check)
+
+# Filtering is applied inside the predict call rather than on the results
+PREDICT_KWARGS = predict_kwargs(model.names, conf=args.conf, classes=args.classes, max_det=args.max_det)
+
+# Concurrent requests share batched forward passes instead of running one by one
+batcher = MicroBatcher(lambda frames: model(frames, **PREDICT_KWARGS),
+                       max_batch_size=args.batch_size,
+                       max_wait_ms=args.batch_wait_ms)
+
+def predict_batch(frames):
+    """Run several images through the shared batcher and wait for all results"""
+    futures = [batcher.submit(frame) for frame in frames]
+    return [future.result() for future in futures]
+
+# Tiled inference for large images, with tiles going through the same batcher
+slicer = SlicedDetector(predict_batch, tile_size=args.tile_size, overlap=args.tile_overlap,
+                        mode=args.slice if args.slice != 'off' else 'tiles',
+                        batch_size=args.batch_size, workers=args.slice_workers)
+
+# Images of /api/detect/batch requests are decoded and detected on this pool;
+# the threads wait on the batcher, so their images share forward passes
+batch_pool = ThreadPoolExecutor(max(args.decode_workers, args.batch_size))
+
+# Content types accepted as a raw encoded image body
+RAW_IMAGE_TYPES = ('image/jpeg', 'image/png', 'image/webp', 'application/octet-stream')
+
+def upload_buffer(upload):
+    """Return the bytes of an uploaded file without copying them where possible"""
+    stream = upload.stream
+    # Small uploads are kept in a BytesIO, whose buffer can be viewed directly
+    if hasattr(stream, 'getbuffer'):
+        return stream.getbuffer()
+    return upload.read()
+
+def read_request_image():
+    """Get the encoded image bytes from a multipart, raw or JSON request"""
+    if request.mimetype == 'multipart/form-data':
+        upload = request.files.get('image') or request.files.get('file')
+        return upload_buffer(upload) if upload else None
+
+    if request.mimetype in RAW_IMAGE_TYPES:
+        return request.get_data(cache=False) or None
+
+    # JSON body with a base64 data URL, as sent by src/api/detection.ts
+    image_data = (request.get_json(silent=True) or {}).get('image')
+    if not image_data:
+        return None
+    return base64.b64decode(image_data.split(',', 1)[-1])
+
+def decode_request_image():
+    """Decode the request image into a BGR frame, or return an error response"""
+    image_bytes = read_request_image()
+    if not image_bytes:
+        return None, (jsonify({'error': 'No image data provided'}), 400)
+
+    nparr = np.frombuffer(image_bytes, np.uint8)
+    frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    if frame is None:
+        return None, (jsonify({'error': 'Could not decode image'}), 400)
+    return frame, None
+
+def decode_image(data):
+    """Decode encoded image bytes into a BGR frame, or None if they are empty or invalid"""
+    if not len(data):
+        return None
+    try:
+        return cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    except cv2.error:
+        # Truncated or malformed data can fail inside the decoder instead of returning None
+        return None
+
+def detect_frame(frame, slice_mode='off'):
+    """Run detection on a frame, returning (detections, slicing timings or None)"""
+    if slice_mode == 'off':
+        return Detections.from_results(batcher.predict(frame)), None
+    return slicer(frame, slice_mode)
 
 @app.route('/api/detect', methods=['POST'])
 def detect():
     try:
         # Get image data from request
-        image_data = request.json.get('image')
-        if not image_data:
-            return jsonify({'error': 'No image data provided'}), 400
-
-        # Decode base64 image
-        image_bytes = base64.b64decode(image_data.split(',')[1])
-        nparr = np.frombuffer(image_bytes, np.uint8)
-        frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-
-        # Run detection
-        results = model(frame)
-        
-        # Get detection results
-        detections = []
-        for result in results:
-            boxes = result.boxes
-            for box in boxes:
-                x1, y1, x2, y2 = box.xyxy[0].tolist()
-                conf = box.conf[0].item()
-                cls = box.cls[0].item()
-                detections.append({
-                    'bbox': [x1, y1, x2, y2],
-                    'confidence': conf,
-                    'class': int(cls)
-                })
-
-        return jsonify({
+        frame, error = decode_request_image()
+        if error:
+            return error
+
+        # Run detection, optionally on overlapping tiles (?slice=off|tiles|hybrid)
+        slice_mode = request.args.get('slice', args.slice)
+        if slice_mode not in SLICE_MODES:
+            return jsonify({'error': f"slice must be one of {', '.join(SLICE_MODES)}"}), 400
+        detections, slicing = detect_frame(frame, slice_mode)
+
+        response = {
             'success': True,
-            'detections': detections
-        })
+            'detections': detections.to_json()
+        }
+        if slicing:
+            response['slicing'] = slicing
+        return jsonify(response)
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def detect_upload(index, filename, image_bytes, slice_mode):
+    """Decode and detect one image of a batch request into an NDJSON record"""
+    record = {'index': index, 'filename': filename}
+    frame = decode_image(image_bytes)
+    if frame is None:
+        record['error'] = 'Could not decode image' if len(image_bytes) else 'Empty file'
+        return record
+    try:
+        detections, slicing = detect_frame(frame, slice_mode)
+    except Exception as e:
+        record['error'] = str(e)
+        return record
+    record['success'] = True
+    record['detections'] = detections.to_json()
+    if slicing:
+        record['slicing'] = slicing
+    return record
+
+@app.route('/api/detect/batch', methods=['POST'])
+def detect_batch():
+    """Detect every image of a multipart upload, streaming results as NDJSON
+
+    Each image is decoded and detected on a worker pool, and its result line
+    is sent as soon as it is ready, so lines may arrive out of order; use
+    `index` (the upload order) or `filename` to match them up. A final
+    `{"done": true, ...}` line summarizes the request.
+    """
+    max_bytes = int(args.batch_max_mb * 1024 * 1024)
+    if request.content_length is not None and request.content_length > max_bytes:
+        return jsonify({'error': f'Request larger than {args.batch_max_mb:g} MB'}), 413
+    if request.mimetype != 'multipart/form-data':
+        return jsonify({'error': 'Expected a multipart/form-data upload'}), 400
+    slice_mode = request.args.get('slice', args.slice)
+    if slice_mode not in SLICE_MODES:
+        return jsonify({'error': f"slice must be one of {', '.join(SLICE_MODES)}"}), 400
+
+    # Chunked uploads have no Content-Length, so stop parsing the body once
+    # it passes the limit instead of spooling all of it to disk first
+    request.max_content_length = max_bytes
+    try:
+        uploads = [upload for _, upload in request.files.items(multi=True)]
+    except RequestEntityTooLarge:
+        return jsonify({'error': f'Request larger than {args.batch_max_mb:g} MB'}), 413
+    if not uploads:
+        return jsonify({'error': 'No images provided'}), 400
+    if len(uploads) > args.batch_max_images:
+        return jsonify({'error': f'At most {args.batch_max_images} images per request'}), 413
+    # Each image is submitted as soon as it is read, so decoding overlaps reading
+    futures = {}
+    for index, upload in enumerate(uploads):
+        data = upload.read()
+        future = batch_pool.submit(detect_upload, index, upload.filename, data, slice_mode)
+        futures[future] = (index, upload.filename)
+        del data
+
+    def generate():
+        failed = 0
+        for future in as_completed(futures):
+            try:
+                record = future.result()
+            except Exception as e:
+                # Keep streaming so the client still gets every line and the summary
+                index, filename = futures[future]
+                record = {'index': index, 'filename': filename, 'error': str(e)}
+            failed += 'error' in record
+            yield json.dumps(record) + '\n'
+        yield json.dumps({'done': True, 'images': len(futures), 'failed': failed}) + '\n'
+
+    return Response(generate(), mimetype='application/x-ndjson')
+
+@app.route('/api/detect/video', methods=['POST'])
+def detect_video():
+    """Detect objects in an uploaded video file, streaming one NDJSON line per processed frame
+
+    The video comes as a multipart `video` field or a raw body. `?stride=N`
+    processes every Nth frame, and `?annotate=1` also renders an annotated
+    video whose URL is given in the final summary line.
+    """
+    max_bytes = int(args.video_max_mb * 1024 * 1024)
+    if request.content_length is not None and request.content_length > max_bytes:
+        return jsonify({'error': f'Video larger than {args.video_max_mb:g} MB'}), 413
+    try:
+        stride = int(request.args.get('stride', 1))
+    except ValueError:
+        return jsonify({'error': 'stride must be an integer'}), 400
+    annotate = request.args.get('annotate', '0').lower() in ('1', 'true', 'yes')
+
+    # Chunked uploads have no Content-Length, so stop reading the body once
+    # it passes the limit, for multipart parsing as well as raw bodies
+    request.max_content_length = max_bytes
+    try:
+        upload = request.files.get('video') if request.mimetype == 'multipart/form-data' else None
+    except RequestEntityTooLarge:
+        return jsonify({'error': f'Video larger than {args.video_max_mb:g} MB'}), 413
+
+    # OpenCV reads videos from files, so spool the upload to disk
+    suffix = os.path.splitext(upload.filename or '')[1] if upload else '.mp4'
+    source = upload.stream if upload else request.stream
+    fd, path = tempfile.mkstemp(suffix=suffix or '.mp4')
+    size = 0
+    with os.fdopen(fd, 'wb') as f:
+        try:
+            for chunk in iter(lambda: source.read(1 << 20), b''):
+                size += len(chunk)
+                if size > max_bytes:
+                    break
+                f.write(chunk)
+        except RequestEntityTooLarge:
+            size = max_bytes + 1
+    if not size or size > max_bytes:
+        os.remove(path)
+        if size:
+            return jsonify({'error': f'Video larger than {args.video_max_mb:g} MB'}), 413
+        return jsonify({'error': 'No video data provided'}), 400
+
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        cap.release()
+        os.remove(path)
+        return jsonify({'error': 'Could not open video'}), 400
+
+    output = None
+    if annotate:
+        os.makedirs(args.video_output_dir, exist_ok=True)
+        prune_video_outputs()
+        output_name = f'{uuid.uuid4().hex}.mp4'
+        output = os.path.join(args.video_output_dir, output_name)
+
+    detector = VideoDetector(predict_batch, stride=stride, batch_size=args.batch_size)
+
+    def generate():
+        try:
+            for record in detector.run(cap, output):
+                if record.get('done') and output:
+                    record['annotated_video'] = f'/api/detect/video/{output_name}'
+                yield json.dumps(record) + '\n'
+        except Exception as e:
+            # A half-written annotated video is of no use to anyone
+            if output and os.path.exists(output):
+                os.remove(output)
+            yield json.dumps({'error': f'Video processing failed: {e}'}) + '\n'
+        finally:
+            os.remove(path)
+
+    return Response(generate(), mimetype='application/x-ndjson')
+
+def prune_video_outputs():
+    """Delete annotated videos older than --video-output-max-age"""
+    cutoff = time.time() - args.video_output_max_age * 3600
+    for entry in os.scandir(args.video_output_dir):
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+        except OSError:
+            # Already removed by a concurrent request
+            pass
+
+@app.route('/api/detect/video/<name>')
+def annotated_video(name):
+    """Download an annotated video rendered by /api/detect/video"""
+    return send_from_directory(os.path.abspath(args.video_output_dir), name, mimetype='video/mp4')
+
+@app.route('/detect', methods=['POST'])
+def detect_image():
+    """Run detection on an uploaded file and return the annotated image"""
+    try:
+        frame, error = decode_request_image()
+        if error:
+            return error
+
+        result = batcher.predict(frame)
+        _, buffer = cv2.imencode('.jpg', result.plot())
+        return Response(buffer.tobytes(), mimetype='image/jpeg')
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# Counters for the WebSocket detection endpoint
+ws_stats = {'connections': 0, 'frames_received': 0, 'frames_replaced': 0, 'frames_processed': 0}
+ws_stats_lock = threading.Lock()
+
+def count_ws(key, amount=1):
+    with ws_stats_lock:
+        ws_stats[key] += amount
+
+@sock.route('/api/detect/ws')
+def detect_ws(ws):
+    """Receive binary JPEG frames and push back detections for the newest one
+
+    A reader thread keeps only the latest received frame, so at most one frame
+    per connection is in flight and a frame that arrives while another is
+    being processed replaces any older one still waiting.
+    """
+    cond = threading.Condition()
+    pending = {'data': None, 'frame': 0, 'closed': False}
+
+    def receive_frames():
+        frame_id = 0
+        try:
+            while True:
+                data = ws.receive()
+                if not isinstance(data, (bytes, bytearray)):
+                    continue
+                frame_id += 1
+                count_ws('frames_received')
+                with cond:
+                    if pending['data'] is not None:
+                        count_ws('frames_replaced')
+                    pending['data'] = data
+                    pending['frame'] = frame_id
+                    cond.notify()
+        except ConnectionClosed:
+            pass
+        finally:
+            with cond:
+                pending['closed'] = True
+                cond.notify()
+
+    count_ws('connections')
+    threading.Thread(target=receive_frames, daemon=True).start()
+    try:
+        while True:
+            with cond:
+                cond.wait_for(lambda: pending['data'] is not None or pending['closed'])
+                if pending['data'] is None:
+                    break
+                data, frame_id = pending['data'], pending['frame']
+                pending['data'] = None
+
+            if not data:
+                ws.send(json.dumps({'frame': frame_id, 'error': 'Empty frame'}))
+                continue
+            frame = decode_image(data)
+            if frame is None:
+                ws.send(json.dumps({'frame': frame_id, 'error': 'Could not decode image'}))
+                continue
+
+            detections = Detections.from_results(batcher.predict(frame))
+            ws.send(json.dumps({'frame': frame_id, 'boxes': detections.to_rows()}))
+            count_ws('frames_processed')
+    except ConnectionClosed:
+        pass
+    finally:
+        count_ws('connections', -1)
+
+@app.route('/api/detect/stats')
+def detect_stats():
+    """Report batching queue depth and batch size distribution"""
+    stats = batcher.stats()
+    with ws_stats_lock:
+        stats['websocket'] = dict(ws_stats)
+    stats['slicing'] = slicer.stats()
+    return jsonify(stats)
+
 if __name__ == '__main__':
     app.run(debug=True) 
\ No newline at end of file
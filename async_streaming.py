@@ -0,0 +1,168 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, HTTPException
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+from streaming import mjpeg_chunk
+
+
+class Subscriber:
+    """One viewer's bounded send queue
+
+    When the client can't keep up, the oldest queued frame is dropped to make
+    room for the new one, so a slow client falls behind on frames instead of
+    holding up the broadcast or growing memory.
+    """
+
+    def __init__(self, kind, queue_size):
+        self.kind = kind
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.sent = 0
+        self.dropped = 0
+
+    def offer(self, payload):
+        """Queue a payload, dropping the oldest one if the queue is full; returns True on a drop"""
+        dropped = self.queue.full()
+        if dropped:
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(payload)
+        return dropped
+
+
+class StreamFanout:
+    """Fan new frames from a FrameBroadcaster out to async subscribers
+
+    A single pump task waits for new frames in a worker thread and encodes
+    each one once; all subscribers are then served from the event loop.
+    """
+
+    def __init__(self, broadcaster, queue_size=2):
+        self.broadcaster = broadcaster
+        self.queue_size = queue_size
+        self.subscribers = set()
+        self.frames_sent = 0
+        self.frames_dropped = 0
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        seq = -1
+        while True:
+            latest = await loop.run_in_executor(None, self.broadcaster.wait, seq, 1.0)
+            if latest is None:
+                continue
+            kinds = {sub.kind for sub in self.subscribers}
+            payloads = {}
+            if 'mjpeg' in kinds:
+                seq, jpeg = await loop.run_in_executor(None, self.broadcaster.jpeg)
+                payloads['mjpeg'] = mjpeg_chunk(jpeg)
+            if 'events' in kinds:
+                seq, text = await loop.run_in_executor(None, self.broadcaster.detections_json)
+                payloads['events'] = f"data: {text}\n\n".encode()
+            if not payloads:
+                seq = latest
+            for sub in list(self.subscribers):
+                if sub.kind in payloads and sub.offer(payloads[sub.kind]):
+                    self.frames_dropped += 1
+
+    async def subscribe(self, kind):
+        """Async generator of payloads for one subscriber of the given kind"""
+        sub = Subscriber(kind, self.queue_size)
+        self.subscribers.add(sub)
+        try:
+            while True:
+                payload = await sub.queue.get()
+                sub.sent += 1
+                self.frames_sent += 1
+                yield payload
+        finally:
+            self.subscribers.discard(sub)
+
+    def stats(self):
+        subscribers = list(self.subscribers)
+        return {
+            'subscribers': {
+                kind: sum(1 for sub in subscribers if sub.kind == kind)
+                for kind in ('mjpeg', 'events')
+            },
+            'queue_size': self.queue_size,
+            'frames_sent': self.frames_sent,
+            'frames_dropped': self.frames_dropped,
+            'max_dropped_per_subscriber': max((sub.dropped for sub in subscribers), default=0),
+        }
+
+
+def create_app(broadcasters, classes=None, stats_fn=None, queue_size=2):
+    """Build the ASGI app serving the stream endpoints of object_detection_server.py
+
+    `broadcasters` maps camera names to their FrameBroadcaster; the routes
+    without a camera name serve the first one.
+    """
+    fanouts = {name: StreamFanout(broadcaster, queue_size) for name, broadcaster in broadcasters.items()}
+    default = next(iter(fanouts))
+
+    def get_fanout(cam):
+        if cam is None:
+            cam = default
+        if cam not in fanouts:
+            raise HTTPException(status_code=404, detail=f"Unknown camera '{cam}'")
+        return fanouts[cam]
+
+    @asynccontextmanager
+    async def lifespan(app):
+        pumps = [asyncio.create_task(fanout.run()) for fanout in fanouts.values()]
+        yield
+        for pump in pumps:
+            pump.cancel()
+
+    app = FastAPI(title='Object Detection Stream', lifespan=lifespan)
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    app.state.fanouts = fanouts
+
+    @app.get('/api/video_feed')
+    @app.get('/api/video_feed/{cam}')
+    async def video_feed(cam: str = None):
+        """MJPEG stream of a camera's annotated frames"""
+        return StreamingResponse(get_fanout(cam).subscribe('mjpeg'),
+                                 media_type='multipart/x-mixed-replace; boundary=frame')
+
+    # Registered before /api/detections/{cam} so 'stream' isn't taken as a camera name
+    @app.get('/api/detections/stream')
+    @app.get('/api/detections/{cam}/stream')
+    async def detections_stream(cam: str = None):
+        """Server-sent events with the detections of each new frame of a camera"""
+        return StreamingResponse(get_fanout(cam).subscribe('events'), media_type='text/event-stream')
+
+    @app.get('/api/detections')
+    @app.get('/api/detections/{cam}')
+    async def detections(cam: str = None):
+        """Detections of a camera's latest processed frame"""
+        broadcaster = get_fanout(cam).broadcaster
+        _, text = await asyncio.get_running_loop().run_in_executor(None, broadcaster.detections_json)
+        return Response(text, media_type='application/json')
+
+    @app.get('/api/cameras')
+    async def get_cameras():
+        return JSONResponse({
+            name: {'video_feed': f'/api/video_feed/{name}', 'detections': f'/api/detections/{name}'}
+            for name in fanouts
+        })
+
+    @app.get('/api/classes')
+    async def get_classes():
+        return JSONResponse(classes or {})
+
+    @app.get('/api/stats')
+    async def get_stats():
+        stats = stats_fn() if stats_fn else {}
+        stats['async_stream'] = {name: fanout.stats() for name, fanout in fanouts.items()}
+        return JSONResponse(stats)
+
+    return app
@@ -0,0 +1,113 @@
+import hashlib
+import os
+import shutil
+
+import numpy as np
+import torch
+from ultralytics import YOLO
+
+from preprocess import model_input_size
+
+# Inference backends and the suffix of each one's exported model. The INT8
+# variants are created by quantize.py from calibration images
+BACKENDS = {
+    'pytorch': None,
+    'onnx': '.onnx',
+    'openvino': '_openvino_model',
+    'onnx-int8': '-int8.onnx',
+    'openvino-int8': '-int8_openvino_model',
+}
+
+
+def weights_hash(path, length=12):
+    """Short SHA-256 of a weights file, used to key its exported models"""
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha.update(chunk)
+    return sha.hexdigest()[:length]
+
+
+def exported_path(weights, backend, imgsz):
+    """Cache location of an exported model next to its weights
+
+    The name includes the weights hash, so retrained weights are exported
+    again instead of silently reusing a stale export.
+    """
+    root, _ = os.path.splitext(weights)
+    return f"{root}-{weights_hash(weights)}-{imgsz}{BACKENDS[backend]}"
+
+
+def export_model(weights, backend, imgsz=640):
+    """Export `weights` for `backend` once and return the cached export's path"""
+    target = exported_path(weights, backend, imgsz)
+    if os.path.exists(target):
+        return target
+    if backend.endswith('-int8'):
+        raise FileNotFoundError(f"No INT8 model at {target}; create it with quantize.py first")
+
+    print(f"Exporting {weights} to {backend} (imgsz={imgsz})...")
+    # Dynamic shapes keep batched calls and minimally padded frames working
+    exported = YOLO(weights).export(format=backend, imgsz=imgsz, dynamic=True)
+    shutil.move(exported, target)
+    print(f"Cached {backend} model at {target}")
+    return target
+
+
+def _raw_output(outputs):
+    """First output tensor of a model call, as a float32 NumPy array"""
+    while isinstance(outputs, (list, tuple)):
+        outputs = outputs[0]
+    if isinstance(outputs, torch.Tensor):
+        outputs = outputs.detach().cpu().numpy()
+    return np.asarray(outputs, np.float32)
+
+
+def check_backend(weights, exported, imgsz=640, rtol=1e-2, atol=1e-3):
+    """Compare an exported model's raw outputs to the PyTorch model's on a fixed input
+
+    Raises RuntimeError if any output differs by more than the tolerance,
+    and returns the largest absolute difference otherwise.
+    """
+    from ultralytics.nn.autobackend import AutoBackend
+
+    generator = torch.Generator().manual_seed(0)
+    image = torch.rand(1, 3, imgsz, imgsz, generator=generator)
+
+    reference = YOLO(weights).model.float().eval()
+    with torch.no_grad():
+        expected = _raw_output(reference(image))
+    actual = _raw_output(AutoBackend(exported, device=torch.device('cpu'), verbose=False)(image))
+
+    if actual.shape != expected.shape:
+        raise RuntimeError(f"{exported} output shape {actual.shape} does not match PyTorch {expected.shape}")
+    max_diff = float(np.abs(actual - expected).max()) if expected.size else 0.0
+    if not np.allclose(actual, expected, rtol=rtol, atol=atol):
+        raise RuntimeError(f"{exported} outputs differ from PyTorch by up to {max_diff:.4g} "
+                           f"(rtol={rtol}, atol={atol})")
+    return max_diff
+
+
+def load_model(weights, backend='pytorch', check=True, rtol=1e-2, atol=1e-3):
+    """Load YOLO weights for inference with the given backend
+
+    Exported models are loaded through ultralytics as well, so callers keep
+    using the same predict call and `Results` objects whatever the backend.
+    INT8 models are not compared with PyTorch here, since quantization is
+    expected to change the raw outputs; quantize.py measures their accuracy.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend '{backend}', expected one of {', '.join(BACKENDS)}")
+    model = YOLO(weights)
+    if backend == 'pytorch':
+        return model
+
+    imgsz = model_input_size(model)
+    path = export_model(weights, backend, imgsz)
+    if check and not backend.endswith('-int8'):
+        max_diff = check_backend(weights, path, imgsz, rtol=rtol, atol=atol)
+        print(f"{backend} model matches PyTorch (max abs diff {max_diff:.2e})")
+
+    exported = YOLO(path, task='detect')
+    exported.overrides['imgsz'] = imgsz
+    return exported
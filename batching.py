@@ -0,0 +1,99 @@
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """Queue single-image requests and run them through the model in batches
+
+    A worker thread takes the first waiting request, then keeps collecting
+    until it has `max_batch_size` images or `max_wait_ms` has passed since
+    that first request arrived. The whole batch goes through `predict_fn` in
+    one call and each caller gets its own result back through a Future.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=8, max_wait_ms=10):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, max_wait_ms / 1000.0)
+
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._batch_sizes = Counter()
+        self._images = 0
+        self._busy_time = 0.0
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, frame):
+        """Queue a frame for inference and return a Future for its result"""
+        future = Future()
+        self._queue.put((frame, future))
+        return future
+
+    def predict(self, frame, timeout=None):
+        """Run a single frame through the batched model and wait for the result"""
+        return self.submit(frame).result(timeout=timeout)
+
+    def _collect_batch(self):
+        """Block for the first request, then gather more until full or timed out"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    # Deadline passed, but take whatever is already waiting
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        """Worker loop: collect a batch, run one forward pass, hand out results"""
+        while True:
+            batch = self._collect_batch()
+            frames = [frame for frame, _ in batch]
+
+            start = time.perf_counter()
+            try:
+                results = self.predict_fn(frames)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            elapsed = time.perf_counter() - start
+
+            results = list(results)
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+            if len(results) != len(batch):
+                # Never leave a caller blocked on a future nobody will resolve
+                error = RuntimeError(f"predict_fn returned {len(results)} results for a batch of {len(batch)}")
+                for _, future in batch[len(results):]:
+                    future.set_exception(error)
+
+            with self._stats_lock:
+                self._batch_sizes[len(batch)] += 1
+                self._images += len(batch)
+                self._busy_time += elapsed
+
+    def stats(self):
+        """Queue depth and the distribution of batch sizes seen so far"""
+        with self._stats_lock:
+            batches = sum(self._batch_sizes.values())
+            return {
+                'queue_depth': self._queue.qsize(),
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000.0,
+                'batches': batches,
+                'images': self._images,
+                'mean_batch_size': self._images / batches if batches else 0.0,
+                'batch_sizes': {str(size): count for size, count in sorted(self._batch_sizes.items())},
+                'images_per_sec': self._images / self._busy_time if self._busy_time else 0.0,
+            }
@@ -0,0 +1,134 @@
+import argparse
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from frame_pool import FramePool
+from frame_sources import open_source
+from streaming import FrameBroadcaster
+
+
+def annotate(frame, index):
+    """Draw stand-in detections and overlay text like the stream server does"""
+    h, w = frame.shape[:2]
+    for i in range(5):
+        x = (index * 7 + i * w // 5) % (w - 200)
+        cv2.rectangle(frame, (x, h // 3), (x + 180, h // 3 + 120), (0, 255, 0), 2)
+        cv2.putText(frame, f'object {i}', (x, h // 3 - 8), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
+    cv2.putText(frame, f'FPS: {index}', (20, 40), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+
+
+class AllocationMeter:
+    """Add up the memory allocated by consecutive steps, traced with tracemalloc
+
+    Each step counts the most memory it had allocated at once on top of
+    what was live when it started. Summing steps keeps a frame freed in one
+    step from hiding a frame allocated in the next.
+    """
+
+    def __init__(self):
+        self.total = 0
+        self._mark()
+
+    def _mark(self):
+        tracemalloc.reset_peak()
+        self._base = tracemalloc.get_traced_memory()[0]
+
+    def step(self):
+        self.total += max(tracemalloc.get_traced_memory()[1] - self._base, 0)
+        self._mark()
+
+
+def run(source, frames, warmup, pooled, jpeg_quality):
+    """Capture, annotate, publish and encode `frames` frames, measuring what each one allocates
+
+    Pooled frames are read into reused buffers and drawn on in place, the
+    way the stream server handles them. Otherwise every frame is read into
+    a new array and copied before drawing, as the server used to do.
+    tracemalloc also sees the arrays numpy and OpenCV allocate.
+    """
+    cap = open_source(source, loop=True, realtime=False)
+    if not cap.isOpened():
+        raise ValueError(f"Could not open frame source {source}")
+    pool = FramePool()
+    broadcaster = FrameBroadcaster(jpeg_quality=jpeg_quality)
+    # Stands in for the capture thread still holding every other frame, so
+    # both the in-place and the copy path of writable() are measured
+    held = None
+
+    allocated = []
+    tracemalloc.start()
+    shape = None
+    start = None
+    for index in range(warmup + frames):
+        if index == warmup:
+            allocations = pool.allocations
+            start = time.perf_counter()
+        meter = AllocationMeter()
+
+        if pooled:
+            buffer = pool.acquire(shape) if shape else None
+            ok, frame = cap.read(buffer.array if buffer else None)
+            buffer = pool.wrap(frame, buffer)
+            shape = frame.shape
+            meter.step()
+            if index % 2:
+                held = buffer.retain()
+            buffer = buffer.writable()
+            if held is not None and not index % 2:
+                held.release()
+                held = None
+            meter.step()
+            annotate(buffer.array, index)
+            broadcaster.publish(buffer)
+        else:
+            ok, frame = cap.read()
+            meter.step()
+            annotated = frame.copy()
+            meter.step()
+            annotate(annotated, index)
+            broadcaster.publish(annotated)
+        meter.step()
+        broadcaster.jpeg()
+        meter.step()
+
+        if index >= warmup:
+            allocated.append(meter.total)
+    elapsed = time.perf_counter() - start
+    tracemalloc.stop()
+    cap.release()
+
+    return {
+        'frame_mb': np.prod(shape or frame.shape) / 2 ** 20,
+        'avg_mb_per_frame': np.mean(allocated) / 2 ** 20,
+        'max_mb_per_frame': np.max(allocated) / 2 ** 20,
+        'buffers_allocated': pool.allocations - allocations if pooled else None,
+        'fps': frames / elapsed,
+        'pool': pool.stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure per-frame memory allocation of the stream frame path')
+    parser.add_argument('--source', type=str, default='synthetic:1920x1080',
+                        help='Frame source (see frame_sources.open_source)')
+    parser.add_argument('--frames', type=int, default=300, help='Frames to measure')
+    parser.add_argument('--warmup', type=int, default=30, help='Frames to run before measuring')
+    parser.add_argument('--jpeg-quality', type=int, default=80, help='Stream JPEG quality')
+    args = parser.parse_args()
+
+    print(f"Frame path memory for {args.frames} frames of {args.source}")
+    for name, pooled in (('copies', False), ('pooled', True)):
+        result = run(args.source, args.frames, args.warmup, pooled, args.jpeg_quality)
+        print(f"  {name:<7} frame {result['frame_mb']:.1f} MB, allocated per frame "
+              f"{result['avg_mb_per_frame']:.2f} MB avg / {result['max_mb_per_frame']:.2f} MB max, "
+              f"{result['fps']:.1f} FPS")
+        if pooled:
+            print(f"          pool buffers allocated while measuring: {result['buffers_allocated']}, "
+                  f"pool {result['pool']}")
+
+
+if __name__ == '__main__':
+    main()
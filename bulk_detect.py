@@ -0,0 +1,329 @@
+import argparse
+import csv
+import hashlib
+import importlib.util
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from backends import BACKENDS, load_model
+from postprocess import Detections, predict_kwargs
+from slicing import SLICE_MODES, SlicedDetector
+
+# Parse command line arguments
+parser = argparse.ArgumentParser(description='Run the detector over folders of archived images')
+parser.add_argument('inputs', nargs='+',
+                    help='Image folders (searched recursively) or text files listing one image path per line')
+parser.add_argument('--output-dir', type=str, required=True,
+                    help='Where the results and the resume manifest are written')
+parser.add_argument('--format', type=str, nargs='+', default=['csv'], choices=['csv', 'parquet', 'coco', 'yolo'],
+                    help='Result formats to write')
+parser.add_argument('--model', type=str, default='public/models/best.pt', help='Path to the YOLO model')
+parser.add_argument('--backend', type=str, default='pytorch', choices=list(BACKENDS), help='Inference backend')
+parser.add_argument('--conf', type=float, default=0.25, help='Confidence threshold')
+parser.add_argument('--classes', type=str, nargs='+', help='Only report these class names or ids')
+parser.add_argument('--max-det', type=int, default=300, help='Maximum detections per image')
+parser.add_argument('--batch-size', type=int, default=16, help='Images per forward pass')
+parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                    help='Processes reading, hashing and decoding images')
+parser.add_argument('--slice', type=str, default='off', choices=SLICE_MODES, help='Sliced inference mode')
+parser.add_argument('--tile-size', type=int, default=640, help='Tile size in pixels for sliced inference')
+parser.add_argument('--tile-overlap', type=float, default=0.2, help='Overlap between neighbouring tiles')
+parser.add_argument('--progress-every', type=float, default=10, help='Seconds between progress lines')
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp', '.tif', '.tiff')
+
+
+def list_images(inputs):
+    """(path, relative path) of every image under the inputs, in a stable order
+
+    Relative paths are unique: listed files keep their path below the
+    directory they all share, and a name already taken by an earlier image
+    (for example from a second folder with the same layout) gets a `~N`
+    suffix, so label files and COCO entries never overwrite each other.
+    """
+    images = []
+    for item in inputs:
+        item = Path(item)
+        if item.is_dir():
+            paths = sorted(p for p in item.rglob('*') if p.suffix.lower() in IMAGE_EXTENSIONS)
+            images.extend((str(p), str(p.relative_to(item))) for p in paths)
+        else:
+            with open(item) as f:
+                paths = [line.strip() for line in f if line.strip()]
+            images.extend(zip(paths, listed_names(paths)))
+
+    taken = set()
+    unique = []
+    for path, rel in images:
+        stem, ext = os.path.splitext(rel)
+        name, n = rel, 1
+        while name in taken:
+            n += 1
+            name = f'{stem}~{n}{ext}'
+        taken.add(name)
+        unique.append((path, name))
+    return unique
+
+
+def listed_names(paths):
+    """Names of listed files relative to the deepest directory they share"""
+    absolute = [os.path.abspath(p) for p in paths]
+    try:
+        root = os.path.commonpath([os.path.dirname(p) for p in absolute])
+    except ValueError:
+        # Paths on different drives share no directory
+        return [os.path.basename(p) for p in paths]
+    return [os.path.relpath(p, root) for p in absolute]
+
+
+def init_worker():
+    # Each worker decodes one image at a time; OpenCV's own threads would
+    # only compete with the other workers and the model
+    cv2.setNumThreads(1)
+
+
+def load_image(path):
+    """Read, hash and decode one image in a worker process; returns (hash, frame or error message)"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+    if not data:
+        return digest, 'Empty file'
+    try:
+        frame = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    except cv2.error as e:
+        # Truncated files can fail inside the decoder instead of returning None
+        return digest, f'Could not decode image: {e}'
+    if frame is None:
+        return digest, 'Could not decode image'
+    return digest, frame
+
+
+class Manifest:
+    """Append-only JSONL record of every finished file, used to resume a run
+
+    Each line holds a file's path, content hash, size and detections (or its
+    error, or the earlier file it duplicates). The result files are written
+    from the manifest, so a resumed run's results include earlier runs.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.records = {}
+        self.hashes = {}
+        complete = True
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    complete = line.endswith('\n')
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A run killed mid-write leaves a partial last line
+                        continue
+                    self._index(record)
+        self._file = open(path, 'a')
+        if not complete:
+            self._file.write('\n')
+
+    def _index(self, record):
+        self.records[record['path']] = record
+        if 'detections' in record:
+            self.hashes.setdefault(record['hash'], record['path'])
+
+    def add(self, record):
+        self._index(record)
+        self._file.write(json.dumps(record) + '\n')
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class Progress:
+    """Periodic progress line with throughput and time remaining"""
+
+    def __init__(self, total, every):
+        self.total = total
+        self.every = every
+        self.start = self.last = time.monotonic()
+        self.counts = {'detected': 0, 'duplicates': 0, 'errors': 0}
+
+    def update(self, key, force=False):
+        if key:
+            self.counts[key] += 1
+        now = time.monotonic()
+        if not force and now - self.last < self.every:
+            return
+        self.last = now
+        done = sum(self.counts.values())
+        rate = done / max(now - self.start, 1e-9)
+        eta = (self.total - done) / rate if rate else 0
+        print(f"{done}/{self.total} images  {rate:.1f} img/s  detected {self.counts['detected']}  "
+              f"duplicates {self.counts['duplicates']}  errors {self.counts['errors']}  "
+              f"ETA {eta / 60:.1f} min", flush=True)
+
+
+def run(args):
+    if 'parquet' in args.format:
+        # Check the optional Parquet dependencies before a long run, not after it
+        missing = [name for name in ('pandas', 'pyarrow') if importlib.util.find_spec(name) is None]
+        if missing:
+            sys.exit(f"--format parquet needs {' and '.join(missing)}: pip install {' '.join(missing)}")
+    os.makedirs(args.output_dir, exist_ok=True)
+    manifest = Manifest(os.path.join(args.output_dir, 'manifest.jsonl'))
+    images = list_images(args.inputs)
+    # Files that failed before are tried again, since the cause may have been transient
+    pending = [(path, rel) for path, rel in images
+               if path not in manifest.records or 'error' in manifest.records[path]]
+    print(f"{len(images)} images, {len(images) - len(pending)} already done, {len(pending)} to process")
+
+    model = load_model(args.model, args.backend)
+    kwargs = predict_kwargs(model.names, conf=args.conf, classes=args.classes, max_det=args.max_det)
+    slicer = None
+    if args.slice != 'off':
+        slicer = SlicedDetector(lambda frames: model(frames, **kwargs), tile_size=args.tile_size,
+                                overlap=args.tile_overlap, mode=args.slice, batch_size=args.batch_size)
+
+    def detect(batch):
+        frames = [frame for _, _, _, frame in batch]
+        if slicer is not None:
+            detections = [slicer(frame)[0] for frame in frames]
+        else:
+            detections = [Detections.from_results(result) for result in model(frames, **kwargs)]
+        for (path, rel, digest, frame), dets in zip(batch, detections):
+            manifest.add({'path': path, 'rel': rel, 'hash': digest, 'width': frame.shape[1],
+                          'height': frame.shape[0], 'detections': dets.to_rows()})
+            progress.update('detected')
+        manifest.flush()
+
+    progress = Progress(len(pending), args.progress_every)
+    batch = []
+    # Keep a bounded number of images decoding ahead of the model
+    in_flight = deque()
+    max_in_flight = args.batch_size * 2 + args.workers
+    paths = iter(pending)
+    with ProcessPoolExecutor(args.workers, initializer=init_worker) as pool:
+        while True:
+            while len(in_flight) < max_in_flight:
+                item = next(paths, None)
+                if item is None:
+                    break
+                in_flight.append((item, pool.submit(load_image, item[0])))
+            if not in_flight:
+                break
+
+            (path, rel), future = in_flight.popleft()
+            try:
+                digest, frame = future.result()
+            except OSError as e:
+                manifest.add({'path': path, 'rel': rel, 'error': str(e)})
+                progress.update('errors')
+                continue
+            if isinstance(frame, str):
+                manifest.add({'path': path, 'rel': rel, 'hash': digest, 'error': frame})
+                progress.update('errors')
+                continue
+
+            # Byte-identical copies reuse the first file's detections
+            original = manifest.hashes.get(digest) or next(
+                (p for p, _, d, _ in batch if d == digest), None)
+            if original is not None:
+                manifest.add({'path': path, 'rel': rel, 'hash': digest, 'duplicate_of': original})
+                progress.update('duplicates')
+                continue
+
+            batch.append((path, rel, digest, frame))
+            if len(batch) >= args.batch_size:
+                detect(batch)
+                batch = []
+        if batch:
+            detect(batch)
+    progress.update(None, force=True)
+    manifest.close()
+
+    write_results(manifest.records, model.names, args.output_dir, args.format)
+
+
+def detection_rows(records):
+    """Yield (record, source record, [x1, y1, x2, y2, conf, cls]) for every detection
+
+    Duplicates take their detections and image size from the file they copy.
+    """
+    for record in records.values():
+        source = records.get(record.get('duplicate_of'), record)
+        for row in source.get('detections', []):
+            yield record, source, row
+
+
+def write_results(records, names, output_dir, formats):
+    columns = ['path', 'x1', 'y1', 'x2', 'y2', 'confidence', 'class_id', 'class_name', 'width', 'height']
+
+    def table():
+        return ([record['path'], *row[:4], row[4], row[5], names.get(row[5], str(row[5])),
+                 source['width'], source['height']] for record, source, row in detection_rows(records))
+
+    if 'csv' in formats:
+        path = os.path.join(output_dir, 'detections.csv')
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(columns)
+            writer.writerows(table())
+        print(f"Wrote {path}")
+
+    if 'parquet' in formats:
+        import pandas as pd
+        path = os.path.join(output_dir, 'detections.parquet')
+        pd.DataFrame(list(table()), columns=columns).to_parquet(path, index=False)
+        print(f"Wrote {path}")
+
+    if 'coco' in formats:
+        path = os.path.join(output_dir, 'coco.json')
+        coco = {'images': [], 'annotations': [],
+                'categories': [{'id': int(k), 'name': v} for k, v in names.items()]}
+        for record in records.values():
+            source = records.get(record.get('duplicate_of'), record)
+            if 'detections' not in source:
+                continue
+            image_id = len(coco['images']) + 1
+            coco['images'].append({'id': image_id, 'file_name': record['rel'],
+                                   'width': source['width'], 'height': source['height']})
+            for x1, y1, x2, y2, conf, cls in source['detections']:
+                w, h = round(x2 - x1, 1), round(y2 - y1, 1)
+                coco['annotations'].append({'id': len(coco['annotations']) + 1, 'image_id': image_id,
+                                            'category_id': cls, 'bbox': [x1, y1, w, h], 'area': round(w * h, 1),
+                                            'score': conf, 'iscrowd': 0})
+        with open(path, 'w') as f:
+            json.dump(coco, f)
+        print(f"Wrote {path}")
+
+    if 'yolo' in formats:
+        labels_dir = os.path.join(output_dir, 'labels')
+        count = 0
+        for record in records.values():
+            source = records.get(record.get('duplicate_of'), record)
+            if 'detections' not in source:
+                continue
+            path = os.path.join(labels_dir, os.path.splitext(record['rel'])[0] + '.txt')
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            w, h = source['width'], source['height']
+            with open(path, 'w') as f:
+                for x1, y1, x2, y2, conf, cls in source['detections']:
+                    f.write(f"{cls} {(x1 + x2) / 2 / w:.6f} {(y1 + y2) / 2 / h:.6f} "
+                            f"{(x2 - x1) / w:.6f} {(y2 - y1) / h:.6f}\n")
+            count += 1
+        print(f"Wrote {count} label files to {labels_dir}")
+
+
+if __name__ == '__main__':
+    run(parser.parse_args())
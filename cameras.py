@@ -0,0 +1,238 @@
+import threading
+import time
+from collections import Counter
+
+from frame_sources import LatestFrameReader, open_source
+from streaming import FrameBroadcaster
+
+
+class Camera:
+    """One named frame source with its own capture thread, stream and per-camera state
+
+    The source is opened when the camera starts. Each camera keeps its own
+    latest-frame buffer, broadcaster, optional motion gate and tracker, and
+    the detections drawn on its last frame.
+    """
+
+    def __init__(self, name, source, priority=1.0, gate=None, tracker=None, jpeg_quality=95,
+                 source_options=None):
+        self.name = name
+        self.source = source
+        self.priority = max(float(priority), 1e-3)
+        self.gate = gate
+        self.tracker = tracker
+        self.source_options = source_options or {}
+        self.broadcaster = FrameBroadcaster(jpeg_quality=jpeg_quality)
+
+        self.cap = None
+        self.reader = None
+        self.last_seq = -1
+        self.detections = []
+
+        self.frames_processed = 0
+        self.fps = 0.0
+        self.lag = 0.0
+        self._last_processed = None
+        self._interval = None
+
+    def start(self, on_update=None):
+        """Open the source and start capturing; returns False if it can't be opened"""
+        self.cap = open_source(self.source, **self.source_options)
+        if not self.cap.isOpened():
+            print(f"Could not open frame source {self.source} for camera {self.name}")
+            return False
+        self.reader = LatestFrameReader(self.cap, on_update=on_update).start()
+        return True
+
+    def stop(self):
+        if self.reader is not None:
+            self.reader.stop()
+        if self.cap is not None:
+            self.cap.release()
+
+    @property
+    def running(self):
+        return self.reader is not None and self.reader.running
+
+    def has_new_frame(self):
+        return self.reader is not None and self.reader.seq > self.last_seq
+
+    def take_frame(self):
+        """Return (seq, timestamp, buffer) of the newest unprocessed frame, or None
+
+        The caller holds a reference to the frame's `FrameBuffer` and
+        releases it, or passes it on to `publish()`.
+        """
+        latest = self.reader.read(self.last_seq, timeout=0) if self.reader else None
+        if latest is not None:
+            self.last_seq = latest[0]
+        return latest
+
+    def publish(self, frame, detections, captured_at, records=None):
+        """Publish an annotated frame and update the processing rate and lag
+
+        A `FrameBuffer` frame's reference passes to the broadcaster.
+        """
+        self.detections = detections
+        self.broadcaster.publish(frame, detections, captured_at, records=records)
+        now = time.time()
+        if self._last_processed is not None:
+            # Smooth the frame interval so uneven scheduling doesn't make the
+            # rate jump around
+            interval = now - self._last_processed
+            self._interval = interval if self._interval is None else 0.9 * self._interval + 0.1 * interval
+            self.fps = 1 / max(self._interval, 1e-6)
+        self._last_processed = now
+        self.lag = now - captured_at
+        self.frames_processed += 1
+
+    def stats(self):
+        stats = {
+            'source': self.source,
+            'priority': self.priority,
+            'frames_processed': self.frames_processed,
+            'fps': self.fps,
+            'lag_ms': self.lag * 1000,
+            'capture': self.reader.stats() if self.reader else {},
+            'stream': self.broadcaster.stats(),
+        }
+        if self.gate is not None:
+            stats['gate'] = self.gate.stats()
+        if self.tracker is not None:
+            stats['tracking'] = self.tracker.stats()
+        return stats
+
+
+class CameraScheduler:
+    """Share one inference loop between several cameras
+
+    `next()` waits until at least one camera has a frame that hasn't been
+    processed and picks which camera goes next:
+
+      round-robin  cameras take turns, skipping ones without a new frame
+      priority     weighted fair share: a camera with priority 2 gets twice
+                   the inference slots of one with priority 1 when both
+                   always have frames waiting, and no camera is starved
+
+    `next_batch()` gathers the newest frame of several cameras at once so
+    they can go through the models in one forward pass.
+
+    Only the newest frame of each camera is ever processed, so a camera that
+    waits longer simply skips more frames instead of falling behind.
+    """
+
+    POLICIES = ('round-robin', 'priority')
+
+    def __init__(self, cameras, policy='round-robin'):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown scheduling policy '{policy}'")
+        self.cameras = list(cameras)
+        self.policy = policy
+
+        self._cond = threading.Condition()
+        self._turn = 0
+        self._pass = {camera.name: 0.0 for camera in self.cameras}
+        self._virtual_time = 0.0
+        self.picks = Counter()
+        self.batches = 0
+        self.batch_wait = 0.0
+
+    def notify(self):
+        with self._cond:
+            self._cond.notify_all()
+
+    def start(self):
+        """Start every camera; returns the ones that opened"""
+        return [camera for camera in self.cameras if camera.start(on_update=self.notify)]
+
+    def stop(self):
+        for camera in self.cameras:
+            camera.stop()
+
+    def _choose(self, ready):
+        if self.policy == 'round-robin':
+            count = len(self.cameras)
+            for offset in range(count):
+                camera = self.cameras[(self._turn + offset) % count]
+                if camera in ready:
+                    self._turn = (self.cameras.index(camera) + 1) % count
+                    return camera
+
+        # Stride scheduling: the camera with the least weighted service goes
+        # next. Idle cameras catch up to the current virtual time instead of
+        # keeping credit, so one coming back can't monopolize the models.
+        passes = {camera.name: max(self._pass[camera.name], self._virtual_time) for camera in ready}
+        camera = min(ready, key=lambda c: (passes[c.name], self.cameras.index(c)))
+        self._virtual_time = passes[camera.name]
+        self._pass[camera.name] = passes[camera.name] + 1 / camera.priority
+        return camera
+
+    def next(self, timeout=None):
+        """Wait for the next camera to process and return (camera, (seq, timestamp, buffer))
+
+        Returns None once every camera has stopped, or when `timeout` expires.
+        """
+        batch = self.next_batch(1, timeout=timeout)
+        return batch[0] if batch else None
+
+    def next_batch(self, max_size=None, max_delay=0.0, timeout=None):
+        """Wait for frames and return up to `max_size` of them as [(camera, (seq, timestamp, buffer)), ...]
+
+        Once one camera has a frame waiting, the others get up to
+        `max_delay` seconds to deliver theirs so the frames can share a
+        forward pass. The wait ends early as soon as every running camera
+        has a frame, so no frame waits longer than `max_delay` for the
+        batch. When more cameras are ready than fit, the policy decides
+        which ones go, one slot at a time. Returns an empty list once every
+        camera has stopped, or when `timeout` expires.
+        """
+        max_size = max_size or len(self.cameras)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                ready = [camera for camera in self.cameras if camera.has_new_frame()]
+                if ready:
+                    break
+                if not any(camera.running for camera in self.cameras):
+                    return []
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return []
+                self._cond.wait(remaining)
+
+            waited = 0.0
+            if max_delay > 0:
+                wait_start = time.monotonic()
+                batch_deadline = wait_start + max_delay
+                while True:
+                    running = sum(camera.running for camera in self.cameras)
+                    if len(ready) >= min(max_size, running):
+                        break
+                    remaining = batch_deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                    ready = [camera for camera in self.cameras if camera.has_new_frame()]
+                waited = time.monotonic() - wait_start
+
+            chosen = []
+            while ready and len(chosen) < max_size:
+                camera = self._choose(ready)
+                ready.remove(camera)
+                chosen.append(camera)
+                self.picks[camera.name] += 1
+            self.batches += 1
+            self.batch_wait += waited
+        return [(camera, camera.take_frame()) for camera in chosen]
+
+    def stats(self):
+        with self._cond:
+            total = sum(self.picks.values())
+            return {
+                'policy': self.policy,
+                'slots': dict(self.picks),
+                'share': {name: count / total for name, count in self.picks.items()} if total else {},
+                'batches': self.batches,
+                'avg_batch_size': total / self.batches if self.batches else 0.0,
+                'avg_batch_wait_ms': self.batch_wait * 1000 / self.batches if self.batches else 0.0,
+            }
@@ -0,0 +1,355 @@
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+import torch
+
+from postprocess import Detections
+from preprocess import SharedPreprocessor, model_input_size, model_stride
+
+
+class ModelWorker:
+    """Dedicated thread that owns one model and its own intra-op thread budget
+
+    torch.set_num_threads() is called from inside the worker thread, so each
+    model's OpenMP team is sized independently and the two models don't
+    oversubscribe the CPU when they run at the same time.
+    """
+
+    def __init__(self, name, model, predict_kwargs, num_threads=None):
+        self.name = name
+        self.model = model
+        self.predict_kwargs = predict_kwargs
+        self.num_threads = num_threads
+
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=f'{name}-worker', daemon=True)
+        self._thread.start()
+
+    def predict(self, sources, preprocessors=None):
+        """Run the model on a batch of sources in the calling thread and return (detections, seconds)
+
+        `sources` are BGR frames, or tensors from shared preprocessors given
+        one per source in `preprocessors`. Tensors of the same shape are
+        stacked into one forward pass; only the box rescaling back to frame
+        coordinates is done per source. Returns one `Detections` per source.
+        """
+        start = time.perf_counter()
+        if preprocessors is None:
+            results = self.model(list(sources), **self.predict_kwargs)
+            return [Detections.from_results(result) for result in results], time.perf_counter() - start
+
+        # Frames of different sizes letterbox to different shapes, which
+        # can't share a forward pass
+        groups = {}
+        for index, source in enumerate(sources):
+            groups.setdefault(tuple(source.shape), []).append(index)
+        detections = [None] * len(sources)
+        for indices in groups.values():
+            batch = torch.cat([sources[i] for i in indices]) if len(indices) > 1 else sources[indices[0]]
+            for index, result in zip(indices, self.model(batch, **self.predict_kwargs)):
+                detections[index] = preprocessors[index].scale(Detections.from_results(result))
+        return detections, time.perf_counter() - start
+
+    def predict_crops(self, frames, regions):
+        """Run the model on crops of several frames in one batch and return (detections, seconds)
+
+        `regions` holds one (N, 4) integer array of xyxy crop windows per
+        frame; boxes are shifted back into their frame's coordinates and
+        one `Detections` is returned per frame.
+        """
+        start = time.perf_counter()
+        crops = [frame[y1:y2, x1:x2]
+                 for frame, windows in zip(frames, regions) for x1, y1, x2, y2 in windows.tolist()]
+        if not crops:
+            return [Detections.empty(self.model.names) for _ in frames], 0.0
+        parts = iter(Detections.from_results(result) for result in self.model(crops, **self.predict_kwargs))
+        detections = []
+        for windows in regions:
+            frame_parts = [next(parts) for _ in range(len(windows))]
+            if not frame_parts:
+                detections.append(Detections.empty(self.model.names))
+                continue
+            detections.append(Detections(
+                np.concatenate([part.xyxy + window[[0, 1, 0, 1]] for part, window in zip(frame_parts, windows)]),
+                np.concatenate([part.conf for part in frame_parts]),
+                np.concatenate([part.cls for part in frame_parts]),
+                frame_parts[0].names,
+            ))
+        return detections, time.perf_counter() - start
+
+    def submit(self, method, *args):
+        """Queue a call of `method` (predict or predict_crops) on this model's thread"""
+        future = Future()
+        self._queue.put((method, args, future))
+        return future
+
+    def _run(self):
+        if self.num_threads:
+            torch.set_num_threads(self.num_threads)
+        while True:
+            method, args, future = self._queue.get()
+            try:
+                future.set_result(method(*args))
+            except Exception as e:
+                future.set_exception(e)
+
+
+class DualModelRunner:
+    """Run the small and medium detectors on each frame
+
+    Modes:
+      parallel    both models run at the same time on their own threads
+      sequential  both models run one after the other
+      cascade     the small model runs first, and the medium model only runs
+                  when the small model is unsure (detections with confidence
+                  in [band_low, band_high)) or finds nothing on a frame flagged
+                  as interesting. With `crop_escalation`, the medium model
+                  only looks at padded crops around the uncertain boxes.
+    """
+
+    def __init__(self, model_s, model_m, kwargs_s, kwargs_m, mode='parallel', threads_per_model=None,
+                 shared_preprocess=True, band_low=0.25, band_high=0.6, crop_escalation=False,
+                 crop_padding=0.5):
+        self.mode = mode
+        if threads_per_model is None:
+            # Split the cores evenly when both models run at once; in cascade
+            # mode they never overlap, so each can use all of them
+            cores = os.cpu_count() or 2
+            threads_per_model = max(1, cores // 2) if mode == 'parallel' else cores
+        self.threads_per_model = threads_per_model
+
+        # The small model's own threshold, applied again to the boxes the cascade keeps
+        self.conf_s = kwargs_s.get('conf')
+        if mode == 'cascade':
+            # The small model has to report uncertain boxes for them to escalate
+            kwargs_s = dict(kwargs_s, conf=min(kwargs_s.get('conf', band_low), band_low))
+        self.workers = [
+            ModelWorker('model_s', model_s, kwargs_s, threads_per_model),
+            ModelWorker('model_m', model_m, kwargs_m, threads_per_model),
+        ]
+
+        # Both models can share one preprocessed tensor only if they expect
+        # the same input size
+        self.preprocessor = None
+        if shared_preprocess and model_input_size(model_s) == model_input_size(model_m):
+            self.preprocessor = SharedPreprocessor(model_input_size(model_s),
+                                                   max(model_stride(model_s), model_stride(model_m)))
+        # Letterbox buffer sets not in use by a prepared batch
+        self._free_buffers = deque([[self.preprocessor]] if self.preprocessor is not None else [])
+
+        self.band_low = band_low
+        self.band_high = band_high
+        self.crop_escalation = crop_escalation
+        self.crop_padding = crop_padding
+
+        self._stats_lock = threading.Lock()
+        self._frames = 0
+        self._batches = 0
+        self._last = {}
+        self._totals = {}
+        self._escalations = {'uncertain': 0, 'empty': 0}
+        self._crops = 0
+        self._last_escalation = None
+
+    def run(self, frame, interesting=False):
+        """Run the models on a frame and return their `Detections` joined per frame
+
+        `interesting` marks frames (for example ones with motion) where the
+        cascade should escalate even if the small model found nothing.
+        """
+        return self.run_batch([frame], [interesting])[0]
+
+    def run_batch(self, frames, interesting=None):
+        """Run the models on several frames at once and return `run()`'s result for each
+
+        Each model sees all the frames in one forward pass, so frames from
+        several cameras cost little more than one. `interesting` holds one
+        flag per frame. Timings are for the whole batch.
+        """
+        return self.infer(frames, self.preprocess(frames), interesting)
+
+    def preprocess(self, frames):
+        """Prepare frames for `infer()` and return (sources, preprocessors, seconds)
+
+        With shared preprocessing, each frame is letterboxed once into a
+        tensor both models read. Every prepared batch gets its own set of
+        buffers, handed back by `infer()`, so a pipeline can prepare the
+        next batch while the previous one is still being inferred.
+        """
+        if self.preprocessor is None:
+            return frames, None, 0.0
+        start = time.perf_counter()
+        try:
+            slots = self._free_buffers.pop()
+        except IndexError:
+            slots = []
+        # Each batch slot keeps its own buffers and letterbox geometry
+        while len(slots) < len(frames):
+            slots.append(SharedPreprocessor(self.preprocessor.imgsz, self.preprocessor.stride))
+        sources = [preprocessor(frame) for preprocessor, frame in zip(slots, frames)]
+        return sources, slots, time.perf_counter() - start
+
+    def infer(self, frames, prepared, interesting=None, select=None):
+        """Run the models on frames prepared by `preprocess()` and return `run_batch()`'s result
+
+        `select` lists the indices of the frames to run, by default all of
+        them; results are returned for those frames only.
+        """
+        sources, preprocessors, preprocess_seconds = prepared
+        if select is not None:
+            frames, sources = [frames[i] for i in select], [sources[i] for i in select]
+            interesting = [interesting[i] for i in select] if interesting else None
+            if preprocessors is not None:
+                preprocessors = [preprocessors[i] for i in select]
+        try:
+            if not frames:
+                return []
+            return self._infer(frames, sources, preprocessors, preprocess_seconds, interesting)
+        finally:
+            self.release(prepared)
+
+    def release(self, prepared):
+        """Hand the buffers of a batch from `preprocess()` back without inferring it
+
+        `infer()` does this itself; call it for a prepared batch that is
+        dropped before reaching `infer()`, or its buffers are never reused.
+        """
+        if prepared[1] is not None:
+            self._free_buffers.append(prepared[1])
+
+    def _infer(self, frames, sources, preprocessors, preprocess_seconds, interesting):
+        start = time.perf_counter()
+        timings = {}
+        interesting = interesting or [False] * len(frames)
+        if preprocessors is not None:
+            timings['preprocess'] = preprocess_seconds
+
+        if self.mode == 'cascade':
+            detections = self._run_cascade(frames, sources, preprocessors, interesting, timings)
+        else:
+            if self.mode == 'parallel':
+                futures = [worker.submit(worker.predict, sources, preprocessors) for worker in self.workers]
+                outputs = [future.result() for future in futures]
+            else:
+                outputs = [worker.predict(sources, preprocessors) for worker in self.workers]
+            for worker, (_, seconds) in zip(self.workers, outputs):
+                timings[worker.name] = seconds
+            detections = [list(per_frame) for per_frame in zip(*(dets for dets, _ in outputs))]
+
+        timings['total'] = preprocess_seconds + time.perf_counter() - start
+        self._record(timings, len(frames))
+        return detections
+
+    def _run_cascade(self, frames, sources, preprocessors, interesting, timings):
+        small, medium = self.workers
+        detections_s, timings[small.name] = small.submit(small.predict, sources, preprocessors).result()
+
+        uncertain = [(dets.conf >= self.band_low) & (dets.conf < self.band_high) for dets in detections_s]
+        reasons = []
+        for dets, mask, flag in zip(detections_s, uncertain, interesting):
+            if mask.any():
+                reasons.append('uncertain')
+            elif not len(dets) and flag:
+                reasons.append('empty')
+            else:
+                reasons.append(None)
+
+        with self._stats_lock:
+            self._last_escalation = reasons[-1]
+            for reason in reasons:
+                if reason:
+                    self._escalations[reason] += 1
+
+        # Boxes the small model keeps still have to pass the threshold it was
+        # asked for, which can be above the lowered one it ran with
+        kept = [~mask if self.conf_s is None else ~mask & (dets.conf >= self.conf_s)
+                for dets, mask in zip(detections_s, uncertain)]
+        detections = [[dets[keep], Detections.empty(medium.model.names)] for dets, keep in zip(detections_s, kept)]
+        escalated = [i for i, reason in enumerate(reasons) if reason]
+        if not escalated:
+            return detections
+
+        # Escalated frames go through the medium model together
+        if self.crop_escalation:
+            crop_frames = [i for i in escalated if reasons[i] == 'uncertain']
+            full_frames = [i for i in escalated if reasons[i] == 'empty']
+        else:
+            crop_frames, full_frames = [], escalated
+
+        timings[medium.name] = 0.0
+        if crop_frames:
+            regions = [self._crop_regions(detections_s[i].xyxy[uncertain[i]], frames[i].shape) for i in crop_frames]
+            with self._stats_lock:
+                self._crops += sum(len(windows) for windows in regions)
+            outputs, seconds = medium.submit(medium.predict_crops, [frames[i] for i in crop_frames],
+                                             regions).result()
+            timings[medium.name] += seconds
+            for i, dets in zip(crop_frames, outputs):
+                detections[i][1] = dets
+        if full_frames:
+            subset = [preprocessors[i] for i in full_frames] if preprocessors is not None else None
+            outputs, seconds = medium.submit(medium.predict, [sources[i] for i in full_frames], subset).result()
+            timings[medium.name] += seconds
+            for i, dets in zip(full_frames, outputs):
+                detections[i][1] = dets
+        return detections
+
+    def _crop_regions(self, boxes, shape):
+        """Padded integer crop windows around boxes, clipped to the frame"""
+        h, w = shape[:2]
+        size = boxes[:, 2:] - boxes[:, :2]
+        pad = np.maximum(size * self.crop_padding, 32)
+        regions = np.concatenate([boxes[:, :2] - pad, boxes[:, 2:] + pad], axis=1)
+        regions[:, [0, 2]] = regions[:, [0, 2]].clip(0, w)
+        regions[:, [1, 3]] = regions[:, [1, 3]].clip(0, h)
+        return regions.astype(np.int64)
+
+    def _record(self, timings, frames=1):
+        with self._stats_lock:
+            self._frames += frames
+            self._batches += 1
+            self._last = timings
+            for key, seconds in timings.items():
+                self._totals[key] = self._totals.get(key, 0.0) + seconds
+
+    def timing_text(self):
+        """Short per-model timing summary of the last batch for overlays"""
+        with self._stats_lock:
+            return '  '.join(f"{key}: {seconds * 1000:.0f}ms" for key, seconds in self._last.items())
+
+    def stats(self):
+        """Per-model latency of the last batch and the running average per frame, in ms
+
+        Averages are over all frames, so in cascade mode the medium model's
+        average is its amortized cost per frame, and batched frames share
+        the cost of their batch.
+        """
+        with self._stats_lock:
+            frames = self._frames
+            stats = {
+                'mode': self.mode,
+                'threads_per_model': self.threads_per_model,
+                'shared_preprocess': self.preprocessor is not None,
+                'frames': frames,
+                'batches': self._batches,
+                'avg_batch_size': frames / self._batches if self._batches else 0.0,
+                'last_ms': {key: seconds * 1000 for key, seconds in self._last.items()},
+                'avg_ms': {key: seconds * 1000 / frames for key, seconds in self._totals.items()} if frames else {},
+            }
+            if self.mode == 'cascade':
+                escalated = sum(self._escalations.values())
+                stats['cascade'] = {
+                    'band': [self.band_low, self.band_high],
+                    'escalated': escalated,
+                    'escalation_rate': escalated / frames if frames else 0.0,
+                    'reasons': dict(self._escalations),
+                    'crop_escalation': self.crop_escalation,
+                    'crops': self._crops,
+                    'last_escalation': self._last_escalation,
+                }
+            return stats
@@ -0,0 +1,92 @@
+import threading
+import time
+
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """Cheap pre-inference check that skips frames not worth running the detectors on
+
+    Each frame is downscaled to grayscale and compared against the last frame
+    the detectors actually ran on. If too few pixels changed the scene is
+    static and the previous detections can be reused. Frames whose Laplacian
+    variance is below `blur_threshold` are too blurry to be useful and are
+    skipped as well. Inference is forced every `refresh_interval` seconds so
+    slow lighting drift never leaves detections stale for long.
+    """
+
+    def __init__(self, motion_threshold=0.005, pixel_threshold=25, blur_threshold=0.0,
+                 refresh_interval=5.0, width=160):
+        self.motion_threshold = motion_threshold
+        self.pixel_threshold = pixel_threshold
+        self.blur_threshold = blur_threshold
+        self.refresh_interval = refresh_interval
+        self.width = width
+
+        self._reference = None
+        self._reference_time = 0.0
+        self._lock = threading.Lock()
+        self.counts = {'inferred': 0, 'static': 0, 'blurry': 0}
+        self.last_reason = None
+        self.last_motion = 0.0
+        self.last_sharpness = 0.0
+
+    def _small_gray(self, frame):
+        h, w = frame.shape[:2]
+        size = (self.width, max(1, int(h * self.width / w)))
+        small = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+
+    def check(self, frame):
+        """Return why the frame should be inferred ('first', 'motion', 'refresh') or skipped ('static', 'blurry')"""
+        gray = self._small_gray(frame)
+        now = time.monotonic()
+
+        if self.blur_threshold > 0:
+            self.last_sharpness = float(cv2.Laplacian(gray, cv2.CV_32F).var())
+            if self.last_sharpness < self.blur_threshold:
+                return self._record('blurry')
+
+        if self._reference is None or self._reference.shape != gray.shape:
+            reason = 'first'
+        else:
+            diff = cv2.absdiff(gray, self._reference)
+            self.last_motion = float(np.count_nonzero(diff > self.pixel_threshold)) / diff.size
+            if self.last_motion >= self.motion_threshold:
+                reason = 'motion'
+            elif now - self._reference_time >= self.refresh_interval:
+                reason = 'refresh'
+            else:
+                return self._record('static')
+
+        self._reference = gray
+        self._reference_time = now
+        return self._record(reason)
+
+    def should_infer(self, frame):
+        """True if the detectors should run on this frame"""
+        return self.check(frame) in ('first', 'motion', 'refresh')
+
+    def _record(self, reason):
+        with self._lock:
+            self.counts['inferred' if reason in ('first', 'motion', 'refresh') else reason] += 1
+        self.last_reason = reason
+        return reason
+
+    def stats(self):
+        """Skip counters and the skip rate"""
+        with self._lock:
+            total = sum(self.counts.values())
+            skipped = self.counts['static'] + self.counts['blurry']
+            return {
+                'frames': total,
+                'inferred': self.counts['inferred'],
+                'skipped_static': self.counts['static'],
+                'skipped_blurry': self.counts['blurry'],
+                'skip_rate': skipped / total if total else 0.0,
+                'last_motion': self.last_motion,
+                'last_sharpness': self.last_sharpness,
+                'motion_threshold': self.motion_threshold,
+                'blur_threshold': self.blur_threshold,
+            }
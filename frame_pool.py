@@ -0,0 +1,149 @@
+import threading
+
+import numpy as np
+
+
+class FrameBuffer:
+    """A frame array from a `FramePool`, shared by reference count
+
+    Whoever gets a buffer holds one reference and calls `release()` when
+    done with it; `retain()` adds a reference for another holder. Once the
+    last reference is released the array goes back to the pool and is
+    reused for a later frame, so nobody may keep the array or a view of it
+    without holding a reference.
+    """
+
+    def __init__(self, pool, array):
+        self.pool = pool
+        self.array = array
+        self._refs = 1
+
+    @property
+    def refs(self):
+        return self._refs
+
+    @property
+    def shape(self):
+        return self.array.shape
+
+    def retain(self):
+        """Add a reference and return the buffer"""
+        with self.pool._lock:
+            if self._refs <= 0:
+                raise RuntimeError('Frame buffer retained after it was released')
+            self._refs += 1
+        return self
+
+    def release(self):
+        with self.pool._lock:
+            if self._refs <= 0:
+                raise RuntimeError('Frame buffer released more often than retained')
+            self._refs -= 1
+            if self._refs == 0:
+                self.pool._recycle(self)
+
+    def view(self):
+        """Read-only view of the frame, for holders that only look at it"""
+        view = self.array.view()
+        view.flags.writeable = False
+        return view
+
+    def writable(self):
+        """Return a buffer only the caller holds, to draw on
+
+        That is this buffer if the caller's reference is the only one, so
+        the frame is drawn on in place. Otherwise the frame is copied into
+        another pooled buffer and the caller's reference to this one is
+        released. Either way the caller holds the returned buffer instead
+        of this one.
+        """
+        if self._refs == 1:
+            with self.pool._lock:
+                self.pool.in_place += 1
+            return self
+        copy = self.pool.acquire(self.array.shape, self.array.dtype)
+        np.copyto(copy.array, self.array)
+        with self.pool._lock:
+            self.pool.copies += 1
+        self.release()
+        return copy
+
+
+class FramePool:
+    """Reusable frame buffers of one frame size
+
+    `acquire()` hands out a free buffer, and only allocates a new one when
+    all of them are in use. The first time a frame size is requested,
+    `size` buffers are allocated up front; once the pipeline has as many
+    buffers as it holds frames at a time, frames stop allocating memory.
+    A new frame size replaces the free buffers of the old one. At most
+    `max_free` released buffers are kept for reuse.
+    """
+
+    def __init__(self, size=4, max_free=16):
+        self.size = size
+        self.max_free = max_free
+
+        self._lock = threading.Lock()
+        self._key = None
+        self._free = []
+
+        self.allocations = 0
+        self.reuses = 0
+        self.in_use = 0
+        self.in_place = 0
+        self.copies = 0
+
+    def _allocate(self, shape, dtype):
+        self.allocations += 1
+        return np.empty(shape, dtype)
+
+    def acquire(self, shape, dtype=np.uint8):
+        """Return a buffer of `shape` with one reference; its contents are undefined"""
+        key = (tuple(shape), np.dtype(dtype))
+        with self._lock:
+            if key != self._key:
+                self._key = key
+                self._free = [self._allocate(*key) for _ in range(self.size)]
+            if self._free:
+                array = self._free.pop()
+                self.reuses += 1
+            else:
+                array = self._allocate(*key)
+            self.in_use += 1
+        return FrameBuffer(self, array)
+
+    def wrap(self, frame, buffer=None):
+        """Return a buffer holding `frame`, which was read into `buffer` if possible
+
+        Readers ask for a buffer of the last frame size and let the source
+        fill it in. If the source put the frame somewhere else instead, for
+        example because the frame size changed, the frame is adopted into
+        the pool and `buffer` is given back.
+        """
+        if buffer is not None and frame is buffer.array:
+            return buffer
+        if buffer is not None:
+            buffer.release()
+        with self._lock:
+            self.allocations += 1
+            self.in_use += 1
+        return FrameBuffer(self, frame)
+
+    def _recycle(self, buffer):
+        # Called with the lock held
+        self.in_use -= 1
+        array = buffer.array
+        if (array.shape, array.dtype) == self._key and array.flags.c_contiguous and len(self._free) < self.max_free:
+            self._free.append(array)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'allocations': self.allocations,
+                'reuses': self.reuses,
+                'in_use': self.in_use,
+                'free': len(self._free),
+                'drawn_in_place': self.in_place,
+                'copied_to_draw': self.copies,
+            }
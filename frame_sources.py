@@ -0,0 +1,376 @@
+import os
+import re
+import sys
+import threading
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from frame_pool import FramePool
+
+
+class LatestFrameReader:
+    """Read frames on a background thread, keeping only the newest one
+
+    Capture runs independently of inference, so the camera driver never
+    builds up a backlog of old frames. Each frame is stamped with a sequence
+    number and capture time; a frame replaced before anyone read it counts
+    as dropped. `on_update` is called after every new frame and when capture
+    stops, so one thread can wait on several readers.
+
+    Frames are read into buffers of `pool`, which the source fills in place
+    where it can, so capturing doesn't allocate a new frame every time.
+    """
+
+    def __init__(self, cap, on_update=None, pool=None):
+        self.cap = cap
+        self.on_update = on_update
+        self.pool = pool or FramePool()
+
+        self._cond = threading.Condition()
+        self._buffer = None
+        self._seq = -1
+        self._timestamp = 0.0
+        self._consumed_seq = -1
+        self._running = False
+        self._thread = None
+
+        self.frames_captured = 0
+        self.frames_dropped = 0
+        self.frames_consumed = 0
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='frame-reader', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2)
+
+    @property
+    def running(self):
+        return self._running
+
+    @property
+    def seq(self):
+        """Sequence number of the newest captured frame"""
+        return self._seq
+
+    def _run(self):
+        shape = None
+        while self._running and self.cap.isOpened():
+            buffer = self.pool.acquire(shape) if shape else None
+            ret, frame = self.cap.read(buffer.array if buffer else None)
+            if not ret:
+                if buffer is not None:
+                    buffer.release()
+                break
+            buffer = self.pool.wrap(frame, buffer)
+            shape = frame.shape
+            # Sources relaying frames from elsewhere keep their capture time
+            timestamp = getattr(self.cap, 'timestamp', None) or time.time()
+            with self._cond:
+                if self._seq > self._consumed_seq:
+                    # The previous frame was never picked up by inference
+                    self.frames_dropped += 1
+                previous, self._buffer = self._buffer, buffer
+                self._seq += 1
+                self._timestamp = timestamp
+                self.frames_captured += 1
+                self._cond.notify_all()
+            if previous is not None:
+                previous.release()
+            if self.on_update is not None:
+                self.on_update()
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self.on_update is not None:
+            self.on_update()
+
+    def read(self, last_seq=-1, timeout=None):
+        """Wait for a frame newer than `last_seq` and return (seq, timestamp, buffer)
+
+        `buffer` is the frame's `FrameBuffer` with a reference for the
+        caller, who releases it when done with the frame. Returns None once
+        capture has stopped and no newer frame is left, or when `timeout`
+        expires.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._seq > last_seq or not self._running, timeout):
+                return None
+            if self._seq <= last_seq:
+                return None
+            if self._seq > self._consumed_seq:
+                self._consumed_seq = self._seq
+                self.frames_consumed += 1
+            return self._seq, self._timestamp, self._buffer.retain()
+
+    def stats(self):
+        """Capture and drop counters"""
+        with self._cond:
+            return {
+                'source': getattr(self.cap, 'name', 'capture'),
+                'frames_captured': self.frames_captured,
+                'frames_consumed': self.frames_consumed,
+                'frames_dropped': self.frames_dropped,
+                'running': self._running,
+                'buffers': self.pool.stats(),
+            }
+
+
+class FrameSource:
+    """Base class of the frame sources, read like a cv2.VideoCapture
+
+    `read()` returns (ok, frame). Like cv2.VideoCapture, it takes an
+    optional `image` array to read the frame into; the frame is only
+    returned in a new array if it doesn't fit. Sources with an `fps` are
+    paced to that rate, so a file or generator plays back like a live
+    camera instead of as fast as it can be decoded.
+    """
+
+    name = 'source'
+
+    def __init__(self, fps=None):
+        self.fps = fps
+        self._opened = True
+        self._next_time = None
+
+    def isOpened(self):
+        return self._opened
+
+    def _read(self, image=None):
+        """Return the next frame, in `image` if it fits, or None at the end of the source"""
+        raise NotImplementedError
+
+    def read(self, image=None):
+        frame = self._read(image) if self._opened else None
+        if frame is None:
+            return False, None
+        self._pace()
+        return True, frame
+
+    def _pace(self):
+        if not self.fps:
+            return
+        now = time.monotonic()
+        if self._next_time is None or now - self._next_time > 1.0:
+            # First frame, or so far behind that catching up would burst
+            self._next_time = now
+        elif self._next_time > now:
+            time.sleep(self._next_time - now)
+        self._next_time += 1.0 / self.fps
+
+    def set(self, prop, value):
+        return False
+
+    def release(self):
+        self._opened = False
+
+
+class CaptureSource(FrameSource):
+    """Camera device or network stream read through cv2.VideoCapture
+
+    Network streams (RTSP, HTTP) are reopened after a read failure, up to
+    `reconnects` times in a row, since cameras and encoders drop connections.
+    """
+
+    def __init__(self, target, name, reconnects=0, reconnect_delay=2.0):
+        super().__init__()
+        self.target = target
+        self.name = name
+        self.reconnects = reconnects
+        self.reconnect_delay = reconnect_delay
+        self.cap = self._open()
+        self._opened = self.cap.isOpened()
+
+    def _open(self):
+        if isinstance(self.target, int) and sys.platform == 'win32':
+            cap = cv2.VideoCapture(self.target, cv2.CAP_DSHOW)
+        else:
+            cap = cv2.VideoCapture(self.target)
+        # Keep the driver from queueing stale frames
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        return cap
+
+    def _read(self, image=None):
+        for attempt in range(self.reconnects + 1):
+            if attempt:
+                print(f"Lost {self.name}, reconnecting ({attempt}/{self.reconnects})...")
+                self.cap.release()
+                time.sleep(self.reconnect_delay)
+                self.cap = self._open()
+            ok, frame = self.cap.read(image)
+            if ok:
+                return frame
+        return None
+
+    def set(self, prop, value):
+        return self.cap.set(prop, value)
+
+    def release(self):
+        super().release()
+        self.cap.release()
+
+
+class VideoFileSource(FrameSource):
+    """Video file played back at its own frame rate, optionally looping"""
+
+    def __init__(self, path, loop=False, realtime=True):
+        self.cap = cv2.VideoCapture(path)
+        super().__init__(fps=(self.cap.get(cv2.CAP_PROP_FPS) or 30.0) if realtime else None)
+        self.name = f'file:{path}'
+        self.loop = loop
+        self._opened = self.cap.isOpened()
+
+    def _read(self, image=None):
+        ok, frame = self.cap.read(image)
+        if not ok and self.loop:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ok, frame = self.cap.read(image)
+        return frame if ok else None
+
+    def release(self):
+        super().release()
+        self.cap.release()
+
+
+class ImageDirSource(FrameSource):
+    """Images of a directory in name order, played back at `fps`"""
+
+    EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+    def __init__(self, path, fps=10.0, loop=False, realtime=True):
+        super().__init__(fps=fps if realtime else None)
+        self.name = f'images:{path}'
+        self.paths = sorted(str(p) for p in Path(path).iterdir() if p.suffix.lower() in self.EXTENSIONS)
+        self.loop = loop
+        self._index = 0
+        self._opened = bool(self.paths)
+
+    def _read(self, image=None):
+        # cv2.imread always decodes into a new array
+        while True:
+            if self._index >= len(self.paths):
+                if not self.loop:
+                    return None
+                self._index = 0
+            frame = cv2.imread(self.paths[self._index])
+            self._index += 1
+            if frame is not None:
+                return frame
+
+
+class SyntheticSource(FrameSource):
+    """Deterministic generated frames of coloured boxes bouncing around
+
+    Needs no camera or files, and the same seed always produces the same
+    frames, so pipeline benchmarks are reproducible on any machine.
+    """
+
+    def __init__(self, width=640, height=480, fps=30.0, objects=6, seed=0, realtime=True):
+        super().__init__(fps=fps if realtime else None)
+        self.name = f'synthetic:{width}x{height}@{fps:g}'
+        self.width = width
+        self.height = height
+        rng = np.random.default_rng(seed)
+        self.size = rng.uniform(0.08, 0.25, (objects, 2)) * (width, height)
+        self.position = rng.uniform(0, 1, (objects, 2)) * ((width, height) - self.size)
+        self.velocity = rng.uniform(-6, 6, (objects, 2))
+        self.colors = rng.integers(40, 255, (objects, 3)).tolist()
+        self.background = np.full((height, width, 3), 90, np.uint8)
+        self.frame_index = 0
+
+    def _read(self, image=None):
+        limit = np.array([self.width, self.height]) - self.size
+        self.position += self.velocity
+        bounced = (self.position < 0) | (self.position > limit)
+        self.velocity[bounced] *= -1
+        self.position = self.position.clip(0, limit)
+
+        if image is not None and image.shape == self.background.shape:
+            frame = image
+            np.copyto(frame, self.background)
+        else:
+            frame = self.background.copy()
+        for (x, y), (w, h), color in zip(self.position.astype(int).tolist(),
+                                         self.size.astype(int).tolist(), self.colors):
+            cv2.rectangle(frame, (x, y), (x + w, y + h), color, -1)
+        cv2.putText(frame, str(self.frame_index), (10, self.height - 10),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
+        self.frame_index += 1
+        return frame
+
+
+class SharedMemorySource(FrameSource):
+    """Frames another process writes into a shared-memory `FrameRing`
+
+    Used by the inference worker process to read the frames the web process
+    captures. Each read waits for a frame newer than the last one and keeps
+    its original capture time in `timestamp`.
+    """
+
+    def __init__(self, ring_name):
+        from inference_process import FrameRing
+        super().__init__()
+        self.name = f'shm:{ring_name}'
+        self.ring = FrameRing.attach(ring_name)
+        self.timestamp = None
+        self._seq = self.ring.latest_seq - 1
+
+    def _read(self, image=None):
+        while self._opened:
+            latest = self.ring.wait(self._seq, timeout=0.5, out=image)
+            if latest is not None:
+                self._seq, self.timestamp, frame, _ = latest
+                return frame
+        return None
+
+    def release(self):
+        self._opened = False
+
+
+def open_source(spec, loop=False, realtime=True, fps=None):
+    """Open a frame source from a command line spec
+
+      0, 1, ...                  camera device index
+      synthetic[:WxH[@FPS]]      generated test frames
+      rtsp://..., http(s)://...  network stream
+      path/to/dir                images in the directory
+      path/to/video.mp4          video file
+      shm:NAME                   frames written into a FrameRing by another process
+
+    `loop` restarts files and image directories at the end, and `realtime`
+    paces them at their frame rate (or `fps`) instead of reading flat out.
+    """
+    spec = str(spec)
+    if spec.startswith('shm:'):
+        return SharedMemorySource(spec[4:])
+
+    if spec.isdigit():
+        return CaptureSource(int(spec), f'device:{spec}')
+
+    match = re.fullmatch(r'synthetic(?::(\d+)x(\d+))?(?:@([\d.]+))?', spec)
+    if match:
+        width, height, rate = match.groups()
+        return SyntheticSource(int(width or 640), int(height or 480), float(rate or fps or 30),
+                               realtime=realtime)
+
+    if re.match(r'^[a-z][a-z0-9+.-]*://', spec, re.IGNORECASE):
+        # Keep credentials in the URL out of logs and stats
+        return CaptureSource(spec, 'stream:' + re.sub(r'//[^/@]*@', '//', spec), reconnects=5)
+
+    if os.path.isdir(spec):
+        return ImageDirSource(spec, fps=fps or 10.0, loop=loop, realtime=realtime)
+
+    if os.path.isfile(spec):
+        return VideoFileSource(spec, loop=loop, realtime=realtime)
+
+    raise ValueError(f"Unknown frame source '{spec}'")
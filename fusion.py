@@ -0,0 +1,138 @@
+import threading
+
+import numpy as np
+import torch
+from torchvision.ops import batched_nms
+
+from postprocess import Detections, box_iou
+
+
+def parse_name_map(pairs):
+    """Parse 'source=target' class name pairs from the command line into a dict"""
+    name_map = {}
+    for pair in pairs or []:
+        source, sep, target = pair.partition('=')
+        if not sep or not source or not target:
+            raise ValueError(f"Invalid class mapping '{pair}', expected source=target")
+        name_map[source] = target
+    return name_map
+
+
+class DetectionFusion:
+    """Merge the detections of several models into one deduplicated `Detections`
+
+    Each model's class names are first mapped into one shared label space:
+    names listed in `name_map` are renamed, and identical names from
+    different models become the same class. All boxes are then fused in one
+    vectorized pass, class-aware, so an object found by both models is kept
+    once:
+
+      nms  keep the most confident box of each overlapping group
+      wbf  weighted box fusion: average each group's boxes weighted by
+           confidence, and scale the score by how many models agreed
+    """
+
+    def __init__(self, method='nms', iou_threshold=0.5, name_map=None):
+        if method not in ('nms', 'wbf'):
+            raise ValueError(f"Unknown fusion method '{method}'")
+        self.method = method
+        self.iou_threshold = iou_threshold
+        self.name_map = name_map or {}
+
+        self.names = {}
+        self._name_ids = {}
+        self._lock = threading.Lock()
+        self.frames = 0
+        self.boxes_in = 0
+        self.boxes_out = 0
+
+    def _class_ids(self, detections):
+        """Map one model's class ids into the shared label space with a lookup table"""
+        if not len(detections):
+            return np.zeros(0, np.int64)
+        table = np.zeros(int(detections.cls.max()) + 1, np.int64)
+        for cls in np.unique(detections.cls).tolist():
+            name = detections.names.get(cls, str(cls))
+            name = self.name_map.get(name, name)
+            if name not in self._name_ids:
+                self._name_ids[name] = len(self._name_ids)
+                self.names[self._name_ids[name]] = name
+            table[cls] = self._name_ids[name]
+        return table[detections.cls]
+
+    def __call__(self, detections_list):
+        """Fuse a list of `Detections` (one per model) of the same frame"""
+        with self._lock:
+            cls = np.concatenate([self._class_ids(d) for d in detections_list] or [np.zeros(0, np.int64)])
+            names = dict(self.names)
+        if not len(cls):
+            fused = Detections.empty(names)
+        else:
+            xyxy = np.concatenate([d.xyxy for d in detections_list]).astype(np.float32)
+            conf = np.concatenate([d.conf for d in detections_list]).astype(np.float32)
+            if self.method == 'nms':
+                fused = self._nms(xyxy, conf, cls, names)
+            else:
+                model = np.concatenate([np.full(len(d), i) for i, d in enumerate(detections_list)])
+                # Only models that returned boxes count towards agreement, so a
+                # model that was skipped (cascade mode) doesn't halve every score
+                num_models = sum(1 for d in detections_list if len(d))
+                fused = self._wbf(xyxy, conf, cls, model, num_models, names)
+
+        with self._lock:
+            self.frames += 1
+            self.boxes_in += len(cls)
+            self.boxes_out += len(fused)
+        return fused
+
+    def _nms(self, xyxy, conf, cls, names):
+        keep = batched_nms(torch.from_numpy(xyxy), torch.from_numpy(conf), torch.from_numpy(cls),
+                           self.iou_threshold).numpy()
+        return Detections(xyxy[keep], conf[keep], cls[keep], names)
+
+    def _wbf(self, xyxy, conf, cls, model, num_models, names):
+        order = np.argsort(-conf)
+        xyxy, conf, cls, model = xyxy[order], conf[order], cls[order], model[order]
+        n = len(conf)
+
+        # overlaps[i, j]: box j is a more confident, same-class box overlapping box i
+        overlaps = box_iou(xyxy, xyxy) > self.iou_threshold
+        overlaps &= cls[:, None] == cls[None, :]
+        overlaps &= np.tri(n, k=-1, dtype=bool)
+
+        # Boxes no more confident box overlaps lead a cluster; every other box
+        # joins the most confident leader it overlaps
+        leader = ~overlaps.any(axis=1)
+        joins = overlaps & leader[None, :]
+        orphan = ~leader & ~joins.any(axis=1)
+        leader |= orphan
+        cluster = np.where(leader, np.arange(n), joins.argmax(axis=1))
+
+        # Confidence-weighted box average and mean score per cluster
+        _, cluster = np.unique(cluster, return_inverse=True)
+        clusters = cluster.max() + 1
+        weight = np.bincount(cluster, conf, clusters)
+        boxes = np.stack([np.bincount(cluster, xyxy[:, k] * conf, clusters) for k in range(4)], axis=1)
+        boxes /= weight[:, None] + 1e-9
+        size = np.bincount(cluster, minlength=clusters)
+        score = weight / size
+
+        # Clusters only some of the models agreed on are down-weighted
+        agreeing = np.zeros((clusters, model.max() + 1), bool)
+        agreeing[cluster, model] = True
+        score *= agreeing.sum(axis=1) / num_models
+
+        first = np.full(clusters, n)
+        np.minimum.at(first, cluster, np.arange(n))
+        return Detections(boxes.astype(np.float32), score.astype(np.float32), cls[first], names)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'method': self.method,
+                'iou_threshold': self.iou_threshold,
+                'frames': self.frames,
+                'boxes_in': self.boxes_in,
+                'boxes_out': self.boxes_out,
+                'duplicates_removed': self.boxes_in - self.boxes_out,
+            }
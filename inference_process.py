@@ -0,0 +1,360 @@
+import json
+import multiprocessing
+import os
+import threading
+import time
+from functools import partial
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from frame_pool import FrameBuffer, FramePool
+from streaming import detection_records
+
+WORKER_NAME = 'inference-worker'
+
+
+class FrameRing:
+    """Ring of frame slots in shared memory, written by one process and read by others
+
+    Each write goes to the next of `slots` slots and is stamped with a
+    sequence number. A reader copies the newest slot and checks the slot's
+    sequence number before and after the copy, so a slot overwritten
+    mid-copy is detected and retried instead of returned torn. No lock is
+    shared between the processes, so a writer that dies mid-write can't
+    block its readers. Next to the frame, each slot holds up to
+    `meta_bytes` of metadata, such as detection records.
+    """
+
+    # int64 fields of the ring header: slots, frame bytes, meta bytes, latest seq
+    HEADER = 4
+    # int64 fields of a slot header: seq, height, width, channels, meta length, timestamp in us
+    SLOT_HEADER = 6
+
+    def __init__(self, shm, owner):
+        self.shm = shm
+        self.owner = owner
+        self.name = shm.name
+        self._header = np.ndarray((self.HEADER,), np.int64, buffer=shm.buf)
+        self.slots, self.frame_bytes, self.meta_bytes = (int(v) for v in self._header[:3])
+
+        slot_size = self.SLOT_HEADER * 8 + self.frame_bytes + self.meta_bytes
+        self._slots = []
+        for index in range(self.slots):
+            offset = self.HEADER * 8 + index * slot_size
+            head = np.ndarray((self.SLOT_HEADER,), np.int64, buffer=shm.buf, offset=offset)
+            offset += self.SLOT_HEADER * 8
+            data = np.ndarray((self.frame_bytes,), np.uint8, buffer=shm.buf, offset=offset)
+            meta = np.ndarray((self.meta_bytes,), np.uint8, buffer=shm.buf, offset=offset + self.frame_bytes)
+            self._slots.append((head, data, meta))
+
+    @classmethod
+    def create(cls, slots=3, frame_bytes=8 << 20, meta_bytes=0):
+        """Allocate a new ring; its `name` is what other processes attach to
+
+        Raises OSError if shared memory (/dev/shm on Linux) has no room for
+        the ring, rather than crashing with SIGBUS when a slot is first written.
+        """
+        size = cls.HEADER * 8 + slots * (cls.SLOT_HEADER * 8 + frame_bytes + meta_bytes)
+        shm = shared_memory.SharedMemory(create=True, size=size)
+        # The segment is only sized, not backed, until its pages are touched;
+        # reserve them now so a full /dev/shm fails here
+        fd = getattr(shm, '_fd', -1)
+        if hasattr(os, 'posix_fallocate') and fd >= 0:
+            try:
+                os.posix_fallocate(fd, 0, size)
+            except OSError as e:
+                shm.close()
+                shm.unlink()
+                raise OSError(e.errno, f"Could not allocate {size / (1 << 20):.0f} MB of shared memory for "
+                                       f"a frame ring ({e.strerror}); use smaller slots or enlarge /dev/shm") from e
+        header = np.ndarray((cls.HEADER,), np.int64, buffer=shm.buf)
+        header[:] = [slots, frame_bytes, meta_bytes, -1]
+        for index in range(slots):
+            offset = cls.HEADER * 8 + index * (cls.SLOT_HEADER * 8 + frame_bytes + meta_bytes)
+            np.ndarray((1,), np.int64, buffer=shm.buf, offset=offset)[0] = -1
+        del header
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name):
+        """Open a ring created by another process"""
+        # Workers started by the creating process share its resource
+        # tracker, which removes the segment if that process dies without
+        # closing the ring
+        return cls(shared_memory.SharedMemory(name=name), owner=False)
+
+    @property
+    def latest_seq(self):
+        return int(self._header[3])
+
+    def write(self, frame, timestamp=None, meta=b''):
+        """Write a uint8 frame and its metadata into the next slot and return its sequence number"""
+        frame = np.ascontiguousarray(frame)
+        if frame.nbytes > self.frame_bytes or len(meta) > self.meta_bytes:
+            raise ValueError(f"Frame of {frame.nbytes} bytes with {len(meta)} bytes of metadata doesn't fit "
+                             f"ring slots of {self.frame_bytes} + {self.meta_bytes} bytes")
+        seq = self.latest_seq + 1
+        head, data, meta_view = self._slots[seq % self.slots]
+        head[0] = -1
+        data[:frame.nbytes] = frame.reshape(-1).view(np.uint8)
+        meta_view[:len(meta)] = np.frombuffer(meta, np.uint8)
+        channels = frame.shape[2] if frame.ndim == 3 else 0
+        head[1:] = [frame.shape[0], frame.shape[1], channels, len(meta), int((timestamp or time.time()) * 1e6)]
+        head[0] = seq
+        self._header[3] = seq
+        return seq
+
+    def read(self, last_seq=-1, out=None):
+        """Copy the newest frame if it is newer than `last_seq`
+
+        Returns (seq, timestamp, frame, meta bytes), or None if there is no
+        newer frame or the writer kept overwriting it during the copy. The
+        frame is copied into `out` if it has the frame's shape, otherwise
+        into a new array.
+        """
+        for _ in range(3):
+            seq = self.latest_seq
+            if seq <= last_seq:
+                return None
+            head, data, meta_view = self._slots[seq % self.slots]
+            if head[0] != seq:
+                continue
+            height, width, channels, meta_len, timestamp = head[1:].tolist()
+            shape = (height, width, channels) if channels else (height, width)
+            slot = data[:height * width * max(channels, 1)].reshape(shape)
+            if out is not None and out.shape == shape:
+                frame = out
+                np.copyto(frame, slot)
+            else:
+                frame = slot.copy()
+            meta = meta_view[:meta_len].tobytes()
+            if head[0] == seq:
+                return seq, timestamp / 1e6, frame, meta
+        return None
+
+    def wait(self, last_seq=-1, timeout=None, poll=0.002, out=None):
+        """Wait for a frame newer than `last_seq` and return `read()`'s result, or None on timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            latest = self.read(last_seq, out)
+            if latest is not None:
+                return latest
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            time.sleep(poll)
+
+    def close(self):
+        # Views into the buffer have to go before the segment can be closed
+        self._header = None
+        self._slots = []
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class RingBroadcaster:
+    """Stand-in for a camera's FrameBroadcaster inside the inference worker
+
+    Each published annotated frame goes into the camera's output ring with
+    its detection records as JSON metadata, for the web process to serve.
+    """
+
+    viewers = 0
+
+    def __init__(self, name):
+        self.ring = FrameRing.attach(name)
+        self.frames_published = 0
+
+    def publish(self, frame, detections=None, timestamp=None, records=None):
+        """Copy an annotated frame (an array or a `FrameBuffer`, released here) into the ring"""
+        if records is None:
+            records = detection_records(detections)
+        buffer = frame if isinstance(frame, FrameBuffer) else None
+        try:
+            self.ring.write(buffer.array if buffer else frame, timestamp, json.dumps(records).encode())
+        finally:
+            if buffer is not None:
+                buffer.release()
+        self.frames_published += 1
+
+    def stats(self):
+        return {'frames_published': self.frames_published}
+
+
+def in_worker_process():
+    """True inside the inference worker process
+
+    Also true while the worker imports the main module again at startup,
+    before `multiprocessing.parent_process()` is set.
+    """
+    return multiprocessing.current_process().name == WORKER_NAME
+
+
+def report_stats(stats_fn, ring_name, interval=1.0):
+    """Write `stats_fn()` as JSON into a stats ring every `interval` seconds, from the worker
+
+    Exits the worker once the web process that started it is gone.
+    """
+    ring = FrameRing.attach(ring_name)
+    parent = multiprocessing.parent_process()
+    empty = np.zeros((0, 0), np.uint8)
+    while parent is None or parent.is_alive():
+        try:
+            ring.write(empty, meta=json.dumps(stats_fn()).encode())
+        except Exception as e:
+            print(f"Could not report inference worker stats: {e}")
+        time.sleep(interval)
+    os._exit(0)
+
+
+class InferenceProcess:
+    """Run the detector loop in a worker process, fed through shared-memory frame rings
+
+    The web process keeps capturing: every new frame of a camera is copied
+    into the camera's input ring. The worker runs `target(rings, stats_ring)`,
+    reads the input rings, and writes annotated frames with their detection
+    records into each camera's output ring, which a thread per camera here
+    publishes to the camera's viewers. Frames cross the process boundary as
+    raw bytes in shared memory, never pickled. The worker writes its stats
+    into a stats ring about once a second.
+
+    If the worker dies it is started again after `restart_delay` seconds.
+    The rings outlive it, so viewers only see the stream pause.
+    """
+
+    def __init__(self, target, cameras, frame_bytes=8 << 20, slots=3, restart_delay=1.0):
+        self.target = target
+        self.cameras = cameras
+        self.restart_delay = restart_delay
+        created = []
+        try:
+            for name in cameras:
+                created.append(FrameRing.create(slots, frame_bytes))
+                created.append(FrameRing.create(slots, frame_bytes, 1 << 20))
+            self.stats_ring = FrameRing.create(2, 0, 4 << 20)
+        except OSError:
+            # Don't leave the rings allocated so far behind in /dev/shm
+            for ring in created:
+                ring.close()
+            raise
+        self.rings = {name: (created[2 * i], created[2 * i + 1]) for i, name in enumerate(cameras)}
+
+        # A fresh interpreter, so the worker doesn't inherit this process's
+        # threads or model state half-way through a call
+        self._context = multiprocessing.get_context('spawn')
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._threads = []
+        self.process = None
+        self.restarts = 0
+        self.last_exit_code = None
+        self.frames_too_large = 0
+
+    def start(self):
+        for name, camera in self.cameras.items():
+            input_ring, output_ring = self.rings[name]
+            if camera.start(on_update=partial(self._feed, camera, input_ring)):
+                self._thread(self._collect, camera, output_ring)
+        self._spawn()
+        self._thread(self._monitor)
+        return self
+
+    def _thread(self, target, *args):
+        thread = threading.Thread(target=target, args=args, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def _spawn(self):
+        rings = {name: (input_ring.name, output_ring.name) for name, (input_ring, output_ring) in self.rings.items()}
+        process = self._context.Process(target=self.target, args=(rings, self.stats_ring.name),
+                                        name=WORKER_NAME, daemon=True)
+        process.start()
+        with self._lock:
+            self.process = process
+
+    def _feed(self, camera, ring):
+        """Copy a camera's newest frame into its input ring, on the camera's capture thread"""
+        latest = camera.take_frame()
+        if latest is None:
+            return
+        _, captured_at, buffer = latest
+        try:
+            ring.write(buffer.array, captured_at)
+        except ValueError as e:
+            if not self.frames_too_large:
+                print(f"Camera {camera.name}: {e}")
+            self.frames_too_large += 1
+        finally:
+            buffer.release()
+
+    def _collect(self, camera, ring):
+        """Publish the annotated frames the worker writes for a camera"""
+        # Annotated frames are copied out of the ring into reused buffers,
+        # each released by the camera's broadcaster once a newer frame
+        # replaces it
+        pool = FramePool()
+        seq = ring.latest_seq
+        shape = None
+        while not self._stopping.is_set():
+            buffer = pool.acquire(shape) if shape else None
+            latest = ring.wait(seq, timeout=0.5, out=buffer.array if buffer else None)
+            if latest is None:
+                if buffer is not None:
+                    buffer.release()
+                continue
+            seq, captured_at, frame, meta = latest
+            shape = frame.shape
+            camera.publish(pool.wrap(frame, buffer), None, captured_at, records=json.loads(meta))
+
+    def _monitor(self):
+        """Start the worker again whenever it exits"""
+        while not self._stopping.is_set():
+            process = self.process
+            process.join(0.5)
+            if process.exitcode is None or self._stopping.is_set():
+                continue
+            with self._lock:
+                self.last_exit_code = process.exitcode
+                self.restarts += 1
+            print(f"Inference worker exited with code {process.exitcode}, restarting in {self.restart_delay}s")
+            if self._stopping.wait(self.restart_delay):
+                break
+            self._spawn()
+
+    def restart(self):
+        """Stop the worker; the monitor starts a new one"""
+        with self._lock:
+            process = self.process
+        if process is not None and process.is_alive():
+            process.terminate()
+
+    def worker_stats(self):
+        """The latest stats the worker reported, or {} if it hasn't yet"""
+        latest = self.stats_ring.read()
+        return json.loads(latest[3]) if latest else {}
+
+    def stats(self):
+        with self._lock:
+            process = self.process
+            return {
+                'pid': process.pid if process else None,
+                'alive': bool(process and process.is_alive()),
+                'restarts': self.restarts,
+                'last_exit_code': self.last_exit_code,
+                'frames_too_large': self.frames_too_large,
+            }
+
+    def stop(self):
+        self._stopping.set()
+        if self.process is not None and self.process.is_alive():
+            self.process.terminate()
+            self.process.join(5)
+        for camera in self.cameras.values():
+            camera.stop()
+        for thread in self._threads:
+            thread.join(1)
+        for rings in self.rings.values():
+            for ring in rings:
+                ring.close()
+        self.stats_ring.close()
@@ -0,0 +1,153 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import statistics
+import threading
+import time
+from urllib.parse import urlsplit
+
+import cv2
+import numpy as np
+
+
+def run_demo_server(port, fps, width, height, queue_size):
+    """Serve synthetic frames from the async stream app, with no camera or models"""
+    import uvicorn
+    from async_streaming import create_app
+    from streaming import FrameBroadcaster
+
+    broadcaster = FrameBroadcaster(jpeg_quality=80)
+
+    def publish_frames():
+        frame_id = 0
+        while True:
+            frame = np.full((height, width, 3), 40, np.uint8)
+            x = (frame_id * 8) % (width - 100)
+            cv2.rectangle(frame, (x, height // 3), (x + 100, height // 3 + 100), (0, 255, 0), -1)
+            cv2.putText(frame, f'frame {frame_id}', (20, 40), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+            broadcaster.publish(frame)
+            frame_id += 1
+            time.sleep(1 / fps)
+
+    threading.Thread(target=publish_frames, daemon=True).start()
+    app = create_app({'default': broadcaster}, stats_fn=lambda: {'stream': broadcaster.stats()}, queue_size=queue_size)
+    uvicorn.run(app, host='127.0.0.1', port=port, log_level='warning')
+
+
+async def http_get(url, timeout=5):
+    """Fetch a small JSON response"""
+    parts = urlsplit(url)
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(parts.hostname, parts.port or 80), timeout)
+    writer.write(f"GET {parts.path} HTTP/1.1\r\nHost: {parts.netloc}\r\nConnection: close\r\n\r\n".encode())
+    await writer.drain()
+    data = await asyncio.wait_for(reader.read(), timeout)
+    writer.close()
+    return json.loads(data.split(b'\r\n\r\n', 1)[1].decode())
+
+
+async def viewer(url, duration, read_delay, result):
+    """Hold one MJPEG connection open for `duration` seconds, counting frames"""
+    parts = urlsplit(url)
+    start = time.perf_counter()
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(parts.hostname, parts.port or 80), 10)
+        writer.write(f"GET {parts.path} HTTP/1.1\r\nHost: {parts.netloc}\r\n\r\n".encode())
+        await writer.drain()
+
+        frames = 0
+        tail = b''
+        deadline = start + duration
+        while time.perf_counter() < deadline:
+            try:
+                chunk = await asyncio.wait_for(reader.read(65536), deadline - time.perf_counter())
+            except asyncio.TimeoutError:
+                break
+            if not chunk:
+                break
+            data = tail + chunk
+            count = data.count(b'--frame\r\n')
+            if count and frames == 0:
+                result['first_frame_ms'] = (time.perf_counter() - start) * 1000
+            frames += count
+            tail = data[-9:]
+            if read_delay:
+                # Simulate a viewer on a slow link
+                await asyncio.sleep(read_delay)
+        writer.close()
+        result['frames'] = frames
+        result['ok'] = True
+    except Exception as e:
+        result['error'] = str(e)
+        result['ok'] = False
+
+
+async def run_load_test(args):
+    results = [{} for _ in range(args.clients)]
+    tasks = []
+    for i, result in enumerate(results):
+        read_delay = args.slow_delay if i < args.slow_clients else 0
+        tasks.append(asyncio.create_task(viewer(args.url, args.duration, read_delay, result)))
+        if args.ramp:
+            await asyncio.sleep(args.ramp / args.clients)
+    await asyncio.gather(*tasks)
+
+    ok = [r for r in results if r.get('ok')]
+    fast = [r['frames'] for i, r in enumerate(results) if r.get('ok') and i >= args.slow_clients]
+    slow = [r['frames'] for i, r in enumerate(results) if r.get('ok') and i < args.slow_clients]
+    first = [r['first_frame_ms'] for r in ok if 'first_frame_ms' in r]
+
+    print(f"Viewers connected: {len(ok)}/{args.clients}")
+    if fast:
+        print(f"Frames per viewer: min {min(fast)}, median {statistics.median(fast)}, max {max(fast)} "
+              f"({statistics.median(fast) / args.duration:.1f} FPS median)")
+    if slow:
+        print(f"Slow viewers: median {statistics.median(slow)} frames")
+    if first:
+        print(f"Time to first frame: median {statistics.median(first):.0f}ms, max {max(first):.0f}ms")
+    print(f"Total frames delivered: {sum(r.get('frames', 0) for r in ok)} "
+          f"({sum(r.get('frames', 0) for r in ok) / args.duration:.0f}/s)")
+    errors = {r['error'] for r in results if 'error' in r}
+    if errors:
+        print(f"Errors: {sorted(errors)[:5]}")
+
+    stats_url = args.url.rsplit('/api/', 1)[0] + '/api/stats'
+    try:
+        print(f"Server stats: {json.dumps(await http_get(stats_url))}")
+    except Exception as e:
+        print(f"Could not fetch server stats: {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test for the MJPEG video feed')
+    parser.add_argument('--url', type=str, default=None,
+                        help='Video feed URL (default: a local synthetic demo server)')
+    parser.add_argument('--clients', type=int, default=200, help='Number of concurrent viewers')
+    parser.add_argument('--duration', type=float, default=20, help='Seconds each viewer stays connected')
+    parser.add_argument('--ramp', type=float, default=2, help='Seconds over which viewers connect')
+    parser.add_argument('--slow-clients', type=int, default=10, help='Viewers that read slowly')
+    parser.add_argument('--slow-delay', type=float, default=0.5, help='Pause between reads for slow viewers')
+    parser.add_argument('--port', type=int, default=5099, help='Port for the demo server')
+    parser.add_argument('--fps', type=float, default=15, help='Frame rate of the demo server')
+    parser.add_argument('--queue-size', type=int, default=2, help='Per-viewer send queue of the demo server')
+    args = parser.parse_args()
+
+    server = None
+    if args.url is None:
+        server = multiprocessing.Process(target=run_demo_server,
+                                         args=(args.port, args.fps, 1280, 720, args.queue_size),
+                                         daemon=True)
+        server.start()
+        args.url = f'http://127.0.0.1:{args.port}/api/video_feed'
+        time.sleep(3)
+
+    print(f"Connecting {args.clients} viewers to {args.url} for {args.duration}s")
+    try:
+        asyncio.run(run_load_test(args))
+    finally:
+        if server is not None:
+            server.terminate()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,23 +1,104 @@
 import cv2
-import time
 import threading
-from flask import Flask, Response, jsonify
+from flask import Flask, Response, abort, jsonify
 from flask_cors import CORS
-from ultralytics import YOLO
+from backends import BACKENDS, load_model
+from postprocess import draw_detections, predict_kwargs
+from dual_model import DualModelRunner
+from cameras import Camera, CameraScheduler
+from frame_gate import MotionGate
+from tracking import IoUTracker
+from fusion import DetectionFusion, parse_name_map
+from pipeline import PIPELINE_MODES, Pipeline
+from inference_process import InferenceProcess, RingBroadcaster, in_worker_process, report_stats
 import socket
 import argparse
+import os
 
 # Parse command line arguments
 parser = argparse.ArgumentParser(description='Object Detection with Web Server')
 parser.add_argument('--port', type=int, default=5001, help='Port for the web server')
 parser.add_argument('--model1', type=str, default="./model1.pt", help='Path to the first YOLO model')
 parser.add_argument('--model2', type=str, default="./model2.pt", help='Path to the second YOLO model')
+parser.add_argument('--backend', type=str, default='pytorch', choices=list(BACKENDS),
+                    help='Run the models with PyTorch, or exported to ONNX Runtime or OpenVINO')
+parser.add_argument('--no-backend-check', action='store_true',
+                    help='Skip comparing an exported model\'s outputs with PyTorch at startup')
+parser.add_argument('--source', type=str, default='0',
+                    help='Camera index, video file, image directory, rtsp:// or http:// URL, '
+                         'or synthetic[:WxH[@FPS]] for generated frames')
+parser.add_argument('--camera', type=str, action='append', metavar='NAME=SOURCE',
+                    help='Add a named camera with any --source value; repeat for several cameras '
+                         '(default: one camera named "default" reading --source)')
+parser.add_argument('--camera-priority', type=str, action='append', metavar='NAME=WEIGHT',
+                    help='Share of inference for a camera with --schedule priority (default weight 1)')
+parser.add_argument('--schedule', type=str, default='round-robin', choices=CameraScheduler.POLICIES,
+                    help='How the shared models are allocated across cameras')
+parser.add_argument('--max-batch', type=int, default=0,
+                    help='Most camera frames run through the models together (default: all cameras)')
+parser.add_argument('--max-batch-delay', type=float, default=10.0,
+                    help='Milliseconds a ready frame waits for other cameras to join its batch')
+parser.add_argument('--pipeline-mode', type=str, default='low-latency', choices=list(PIPELINE_MODES),
+                    help='Queue depth between pipeline stages: 1 frame for low latency, deeper for throughput')
+parser.add_argument('--queue-depth', type=int, default=None,
+                    help='Frames each queue between pipeline stages holds (overrides --pipeline-mode)')
+parser.add_argument('--inference-process', action='store_true',
+                    help='Run the models in a worker process that is restarted if it dies; '
+                         'this process only captures frames and serves results')
+parser.add_argument('--shm-frame-mb', type=int, default=8,
+                    help='Largest raw frame in MB passed to the inference process (8 MB fits 1080p BGR)')
+parser.add_argument('--loop', action='store_true', help='Restart a video file or image directory at the end')
+parser.add_argument('--no-realtime', action='store_true',
+                    help='Read files and generated frames as fast as possible instead of at their frame rate')
+parser.add_argument('--source-fps', type=float, default=None,
+                    help='Playback rate of an image directory or synthetic source')
 parser.add_argument('--conf', type=float, default=0.5, help='Confidence threshold')
+parser.add_argument('--classes', type=str, nargs='+', help='Only detect these class names or ids')
+parser.add_argument('--max-det', type=int, default=300, help='Maximum detections per model per frame')
+parser.add_argument('--inference-mode', type=str, default='parallel', choices=['parallel', 'sequential', 'cascade'],
+                    help='Run the two models concurrently, one after the other, or the second only when the first is unsure')
+parser.add_argument('--cascade-band', type=float, nargs=2, default=[0.25, 0.6], metavar=('LOW', 'HIGH'),
+                    help='Small-model confidences in [LOW, HIGH) escalate to the medium model in cascade mode')
+parser.add_argument('--cascade-crops', action='store_true',
+                    help='In cascade mode, run the medium model only on crops around uncertain boxes')
+parser.add_argument('--escalate-empty', action='store_true',
+                    help='In cascade mode, escalate frames where the small model finds nothing '
+                         '(only frames with motion when --gate is on)')
+parser.add_argument('--fusion', type=str, default='nms', choices=['none', 'nms', 'wbf'],
+                    help='Merge the two models\' overlapping boxes by class-aware NMS or weighted box fusion')
+parser.add_argument('--fusion-iou', type=float, default=0.5, help='IoU above which boxes are fused')
+parser.add_argument('--class-map', type=str, nargs='+', metavar='SOURCE=TARGET',
+                    help='Treat class SOURCE of either model as class TARGET when fusing')
+parser.add_argument('--server', type=str, default='flask', choices=['flask', 'asgi'],
+                    help='Serve streams from threaded Flask or from an async event loop')
+parser.add_argument('--send-queue-size', type=int, default=2,
+                    help='Frames buffered per viewer in asgi mode before old ones are dropped')
+parser.add_argument('--gate', action='store_true', help='Skip inference on static or blurry frames')
+parser.add_argument('--motion-threshold', type=float, default=0.005,
+                    help='Fraction of changed pixels that counts as motion when gating')
+parser.add_argument('--blur-threshold', type=float, default=0.0,
+                    help='Minimum sharpness (Laplacian variance) to run inference when gating, 0 to disable')
+parser.add_argument('--gate-refresh', type=float, default=5.0,
+                    help='Seconds after which a static scene is inferred again when gating')
+parser.add_argument('--track-every', type=int, default=0,
+                    help='Run the detectors every N frames and track boxes in between (0 to detect every frame)')
+parser.add_argument('--redetect-conf', type=float, default=0.0,
+                    help='Detect early when a tracked box is less confident than this')
+parser.add_argument('--jpeg-quality', type=int, default=95, help='JPEG quality of the video stream')
+parser.add_argument('--no-shared-preprocess', action='store_true',
+                    help='Let each model preprocess the frame itself')
+parser.add_argument('--threads-per-model', type=int, default=None,
+                    help='Intra-op threads for each model in parallel mode (default: half the cores)')
 args = parser.parse_args()
 
+# With --inference-process, the models only live in the worker process,
+# which imports this module again; this process captures and serves
+serve_only = args.inference_process and not in_worker_process()
+
 # Load models
-model_s = YOLO(args.model1)
-model_m = YOLO(args.model2)
+if not serve_only:
+    model_s = load_model(args.model1, args.backend, check=not args.no_backend_check)
+    model_m = load_model(args.model2, args.backend, check=not args.no_backend_check)
 
 # Define colors for each class (Total: 8 classes)
 CLASS_COLORS = {
@@ -34,9 +115,64 @@ CLASS_COLORS = {
 # Confidence threshold
 CONF_THRESHOLD = args.conf
 
-# Global variable for the latest processed frame
-global_frame = None
-frame_lock = threading.Lock()
+# Frames each queue between pipeline stages holds
+queue_depth = args.queue_depth or PIPELINE_MODES[args.pipeline_mode]
+
+runner = fusion = None
+if not serve_only:
+    # Filtering arguments pushed down into each model's predict call
+    PREDICT_KWARGS_S = predict_kwargs(model_s.names, conf=CONF_THRESHOLD, classes=args.classes, max_det=args.max_det)
+    PREDICT_KWARGS_M = predict_kwargs(model_m.names, conf=CONF_THRESHOLD, classes=args.classes, max_det=args.max_det)
+
+    # Runs both models on each frame and keeps per-model timings
+    runner = DualModelRunner(model_s, model_m, PREDICT_KWARGS_S, PREDICT_KWARGS_M,
+                             mode=args.inference_mode,
+                             threads_per_model=args.threads_per_model,
+                             shared_preprocess=not args.no_shared_preprocess,
+                             band_low=args.cascade_band[0], band_high=args.cascade_band[1],
+                             crop_escalation=args.cascade_crops)
+
+    # Optional fusion of both models' boxes into one deduplicated set
+    if args.fusion != 'none':
+        fusion = DetectionFusion(args.fusion, args.fusion_iou, parse_name_map(args.class_map))
+
+def parse_pairs(pairs, option):
+    """Split NAME=VALUE command line pairs into an ordered dict"""
+    parsed = {}
+    for pair in pairs or []:
+        name, sep, value = pair.partition('=')
+        if not sep or not name or not value:
+            parser.error(f"{option} expects NAME=VALUE, got '{pair}'")
+        parsed[name] = value
+    return parsed
+
+def make_camera(name, source, priority):
+    """Camera with its own gate and tracker, configured from the command line"""
+    # Optional gate that reuses the last detections on static or blurry frames
+    gate = MotionGate(motion_threshold=args.motion_threshold, blur_threshold=args.blur_threshold,
+                      refresh_interval=args.gate_refresh) if args.gate and not serve_only else None
+    # Optional tracker that propagates boxes between detection frames
+    tracker = IoUTracker(detect_every=args.track_every,
+                         redetect_conf=args.redetect_conf) if args.track_every > 0 and not serve_only else None
+    return Camera(name, source, priority, gate=gate, tracker=tracker, jpeg_quality=args.jpeg_quality,
+                  source_options={'loop': args.loop, 'realtime': not args.no_realtime, 'fps': args.source_fps})
+
+# Named cameras sharing the models; each one's latest annotated frame is
+# JPEG-encoded once and shared with all of its viewers
+camera_sources = parse_pairs(args.camera, '--camera') or {'default': args.source}
+camera_priorities = parse_pairs(args.camera_priority, '--camera-priority')
+cameras = {name: make_camera(name, source, float(camera_priorities.get(name, 1)))
+           for name, source in camera_sources.items()}
+default_camera = next(iter(cameras.values()))
+
+# Decides which camera's newest frame the models process next
+scheduler = CameraScheduler(cameras.values(), policy=args.schedule)
+
+# Stage threads of the processing pipeline, once started
+pipeline = None
+
+# Worker process running the pipeline with --inference-process
+worker = None
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -54,118 +190,282 @@ def get_local_ip():
     except Exception as e:
         return "127.0.0.1"
 
-def process_webcam():
-    """Process webcam feed and perform object detection"""
-    global global_frame
-    
-    # Initialize webcam
-    cap = cv2.VideoCapture(0, cv2.CAP_DSHOW)
-    
-    # For FPS calculation
-    prev_time = time.time()
-    fps = 0
-    
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
-        
-        # Start time for FPS
-        current_time = time.time()
-        
-        # Inference with both models
-        results_s = model_s(frame)[0]
-        results_m = model_m(frame)[0]
-        
-        # Prepare annotated frame
-        annotated_frame = frame.copy()
+def wants_inference(camera, frame):
+    """Whether a camera's frame goes through the models
+
+    Static or blurry frames keep the previous detections, and in tracking
+    mode the frames between detections only move the tracks.
+    """
+    gate, tracker = camera.gate, camera.tracker
+    return (tracker is None or tracker.due()) and (gate is None or gate.should_infer(frame))
+
+# Pipeline stages; each one takes a batch of frames from the previous
+# stage, adds its part and passes the batch on. Frames travel in pooled
+# buffers: stages before annotate only see read-only views, and annotate
+# draws on the buffer itself when nothing else holds it
+
+def capture_stage():
+    """Gather the newest frames of the cameras that go next
+
+    Only called once the preprocess stage has room, so every batch the
+    scheduler picks reaches the models and the camera priorities hold;
+    frames that arrive meanwhile replace older ones in each camera.
+    """
+    batch = scheduler.next_batch(args.max_batch, args.max_batch_delay / 1000)
+    if not batch:
+        return None
+    return {'frames': [{'camera': camera, 'captured_at': captured_at, 'buffer': buffer, 'frame': buffer.view()}
+                       for camera, (_, captured_at, buffer) in batch]}
+
+def preprocess_stage(batch):
+    """Letterbox the frames for the models"""
+    # Every frame is prepared, since whether it needs the models is only
+    # decided once it reaches the infer stage
+    batch['prepared'] = runner.preprocess([item['frame'] for item in batch['frames']])
+    return batch
+
+def infer_stage(batch):
+    """Run both models once over all the frames that need them"""
+    frames = batch['frames']
+    for item in frames:
+        camera = item['camera']
+        item['infer'] = wants_inference(camera, item['frame'])
+        item['interesting'] = args.escalate_empty and (camera.gate is None or camera.gate.last_reason == 'motion')
+        if camera.tracker is not None:
+            # The tracker only sees this frame's result in the fuse stage
+            camera.tracker.plan(item['infer'])
+    select = [i for i, item in enumerate(frames) if item['infer']]
+    results = runner.infer([item['frame'] for item in frames], batch.pop('prepared'),
+                           [item['interesting'] for item in frames], select=select)
+    for i, detections in zip(select, results):
+        frames[i]['detections'] = detections
+    return batch
+
+def fuse_stage(batch):
+    """Merge the models' boxes and update the trackers, or reuse/propagate earlier detections"""
+    for item in batch['frames']:
+        camera = item['camera']
+        tracker = camera.tracker
+        if 'detections' in item:
+            detections = item['detections']
+            if fusion is not None:
+                detections = [fusion(detections)]
+            if tracker is not None:
+                detections = [tracker.update(detections)]
+        elif tracker is not None:
+            detections = [tracker.predict()]
+        else:
+            detections = camera.detections
+        item['detections'] = camera.detections = detections
+    return batch
+
+def annotate_stage(batch):
+    """Draw the detections and overlays and publish each frame to its camera's viewers"""
+    for item in batch['frames']:
+        camera, detections = item['camera'], item['detections']
         
-        # Collect boxes from both models
-        detections = []
-        for results, model in [(results_s, model_s), (results_m, model_m)]:
-            for box in results.boxes:
-                if box.conf.item() >= CONF_THRESHOLD:
-                    x1, y1, x2, y2 = map(int, box.xyxy[0])
-                    conf = float(box.conf)
-                    cls = int(box.cls)
-                    class_name = model.names[cls]
-                    color = CLASS_COLORS.get(class_name, (255, 255, 255))  # Default white
-                    detections.append({
-                        'box': (x1, y1, x2, y2),
-                        'conf': conf,
-                        'class_name': class_name,
-                        'color': color
-                    })
+        # Draw on the captured frame, or on a pooled copy if the capture
+        # thread still holds it
+        buffer = item.pop('buffer').writable()
+        annotated_frame = buffer.array
         
         # Draw all detections
         for det in detections:
-            x1, y1, x2, y2 = det['box']
-            label = f"{det['class_name']}: {det['conf']:.2f}"
-            color = det['color']
-            cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), color, 2)
-            cv2.putText(annotated_frame, label, (x1, y1 - 10),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
-        
-        # Calculate FPS
-        fps = 1 / (current_time - prev_time)
-        prev_time = current_time
+            draw_detections(annotated_frame, det, CLASS_COLORS)
         
-        # Draw FPS on frame
-        cv2.putText(annotated_frame, f'FPS: {fps:.2f}', (20, 40),
+        # Draw the camera's processing rate on the frame
+        cv2.putText(annotated_frame, f'{camera.name}  FPS: {camera.fps:.2f}', (20, 40),
                     cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+        cv2.putText(annotated_frame, runner.timing_text(), (20, 70),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
         
-        # Update the global frame with the annotated frame
-        with frame_lock:
-            global_frame = annotated_frame.copy()
-        
-    cap.release()
+        # Publish the annotated frame to the camera's stream viewers
+        camera.publish(buffer, detections, item['captured_at'])
+    return batch
+
+def encode_stage(batch):
+    """JPEG-encode the new frames of cameras that have viewers, once for all of them"""
+    for item in batch['frames']:
+        broadcaster = item['camera'].broadcaster
+        if broadcaster.viewers:
+            broadcaster.jpeg()
+    return None
+
+def release_batch(batch):
+    """Release the frame and letterbox buffers of a batch left in a closed pipeline queue"""
+    for item in batch['frames']:
+        if 'buffer' in item:
+            item.pop('buffer').release()
+    if 'prepared' in batch:
+        runner.release(batch.pop('prepared'))
 
-def generate_frames():
-    """Generate frames for streaming"""
-    global global_frame
+def process_webcam():
+    """Process every camera's frames (the webcam by default) with the shared models"""
+    global pipeline
+    if not scheduler.start():
+        return
     
-    while True:
-        # Ensure we have a frame to send
-        with frame_lock:
-            if global_frame is None:
-                continue
-            frame_to_send = global_frame.copy()
-        
-        # Encode the frame for streaming
-        _, buffer = cv2.imencode('.jpg', frame_to_send)
-        frame_bytes = buffer.tobytes()
-        
-        # Yield the frame in the format expected by Flask's Response
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-        
-        # Add a small delay to control streaming rate
-        time.sleep(0.03)  # ~30 FPS
+    # Each stage runs on its own thread, so a frame can be drawn while the
+    # next one is inferred and the one after that is letterboxed. Queues
+    # block rather than drop batches: a dropped batch would have used up
+    # its cameras' scheduler slots, and after infer its gate and tracker
+    # updates; stale frames are instead replaced in each camera's reader
+    pipeline = Pipeline([
+        ('capture', capture_stage),
+        ('preprocess', preprocess_stage),
+        ('infer', infer_stage),
+        ('fuse', fuse_stage),
+        ('annotate', annotate_stage),
+        ('encode', encode_stage),
+    ], capacity=queue_depth, on_drop=release_batch).start()
+    pipeline.join()
+    
+    scheduler.stop()
+    if pipeline.error is not None:
+        # The other stages are left blocked on their queues and every stream
+        # would freeze on its last frame; exit non-zero so whatever runs the
+        # server (or the web process, for the inference worker) restarts it
+        print(f"Processing pipeline failed: {pipeline.error!r}", flush=True)
+        os._exit(1)
+
+def inference_worker(rings, stats_ring):
+    """Entry point of the --inference-process worker: run the pipeline on frames from shared memory"""
+    for name, camera in cameras.items():
+        input_ring, output_ring = rings[name]
+        camera.source = f'shm:{input_ring}'
+        camera.broadcaster = RingBroadcaster(output_ring)
+    threading.Thread(target=report_stats, args=(collect_stats, stats_ring), daemon=True).start()
+    process_webcam()
+    # The frames from the web process never end, so getting here means
+    # something went wrong; exit so the web process starts a fresh worker
+    os._exit(1)
+
+def get_camera(name=None):
+    """Camera by name, the first one if no name is given; 404 if unknown"""
+    if name is None:
+        return default_camera
+    if name not in cameras:
+        abort(404, description=f"Unknown camera '{name}'")
+    return cameras[name]
+
+@app.route('/api/cameras')
+def list_cameras():
+    """List the cameras and their stream URLs"""
+    return jsonify({
+        name: {'source': camera.source, 'priority': camera.priority,
+               'video_feed': f'/api/video_feed/{name}', 'detections': f'/api/detections/{name}'}
+        for name, camera in cameras.items()
+    })
 
 @app.route('/api/video_feed')
-def video_feed():
-    """Route for the video feed"""
-    return Response(generate_frames(), 
+@app.route('/api/video_feed/<cam>')
+def video_feed(cam=None):
+    """Route for a camera's video feed"""
+    # Each viewer waits for new frames instead of re-encoding the same one
+    return Response(get_camera(cam).broadcaster.stream(),
                     mimetype='multipart/x-mixed-replace; boundary=frame')
 
+@app.route('/api/detections')
+@app.route('/api/detections/<cam>')
+def get_detections(cam=None):
+    """Get the detections of a camera's latest processed frame"""
+    _, text = get_camera(cam).broadcaster.detections_json()
+    return Response(text, mimetype='application/json')
+
+@app.route('/api/detections/stream')
+@app.route('/api/detections/<cam>/stream')
+def detections_stream(cam=None):
+    """Stream the detections of each new frame of a camera as server-sent events"""
+    return Response(get_camera(cam).broadcaster.event_stream(), mimetype='text/event-stream')
+
+def class_info():
+    """Detection classes and their colors"""
+    # Convert BGR colors to RGB for frontend
+    return {name: {'color': (c[2], c[1], c[0])} for name, c in CLASS_COLORS.items()}
+
 @app.route('/api/classes')
 def get_classes():
     """Get the list of detection classes and their colors"""
-    # Convert BGR colors to RGB for frontend
-    classes = {name: {'color': (c[2], c[1], c[0])} for name, c in CLASS_COLORS.items()}
-    return jsonify(classes)
+    return jsonify(class_info())
+
+def collect_stats():
+    """Pipeline timing and counter statistics"""
+    if worker is not None:
+        # Capture and stream counters are kept here, the rest by the worker
+        stats = worker.worker_stats()
+        worker_cameras = stats.get('cameras', {})
+        stats['cameras'] = {}
+        for name, camera in cameras.items():
+            merged = dict(worker_cameras.get(name, {}), **camera.stats())
+            # Frames are only skipped by the worker, which reads the newest one
+            worker_capture = worker_cameras.get(name, {}).get('capture', {})
+            for key in ('frames_consumed', 'frames_dropped'):
+                merged['capture'][key] = worker_capture.get(key, 0)
+            stats['cameras'][name] = merged
+        stats['worker'] = worker.stats()
+        return stats
+    stats = {
+        'inference': runner.stats(),
+        'scheduler': scheduler.stats(),
+        'cameras': {name: camera.stats() for name, camera in cameras.items()},
+    }
+    if fusion is not None:
+        stats['fusion'] = fusion.stats()
+    if pipeline is not None:
+        stats['pipeline'] = dict(pipeline.stats(), mode=args.pipeline_mode)
+    return stats
+
+@app.route('/api/worker/restart', methods=['POST'])
+def restart_worker():
+    """Restart the inference worker process without restarting the server"""
+    if worker is None:
+        abort(404, description='Not running with --inference-process')
+    worker.restart()
+    return jsonify(worker.stats())
+
+@app.route('/api/stats')
+def get_stats():
+    """Get pipeline timing statistics"""
+    return jsonify(collect_stats())
 
 if __name__ == "__main__":
-    # Start webcam processing in a separate thread
-    webcam_thread = threading.Thread(target=process_webcam, daemon=True)
-    webcam_thread.start()
+    if serve_only:
+        # Capture here and run the models in a worker process
+        try:
+            worker = InferenceProcess(inference_worker, cameras, frame_bytes=args.shm_frame_mb << 20)
+        except OSError as e:
+            raise SystemExit(f"Could not start the inference process: {e}. "
+                             f"Lower --shm-frame-mb or enlarge /dev/shm (docker run --shm-size)")
+        worker.start()
+    else:
+        # Start webcam processing in a separate thread
+        webcam_thread = threading.Thread(target=process_webcam, daemon=True)
+        webcam_thread.start()
     
     # Print access information
     server_ip = get_local_ip()
     print(f"Object Detection Server starting up!")
     print(f"API endpoints available at: http://{server_ip}:{args.port}")
-    print(f"Video feed: http://{server_ip}:{args.port}/api/video_feed")
+    for name in cameras:
+        print(f"Video feed ({name}): http://{server_ip}:{args.port}/api/video_feed/{name}")
+    print(f"Cameras: http://{server_ip}:{args.port}/api/cameras")
     print(f"Classes: http://{server_ip}:{args.port}/api/classes")
+    print(f"Detections: http://{server_ip}:{args.port}/api/detections")
+    print(f"Stats: http://{server_ip}:{args.port}/api/stats")
     
-    # Start the Flask server
-    app.run(host='0.0.0.0', port=args.port, debug=False, threaded=True)
\ No newline at end of file
+    try:
+        if args.server == 'asgi':
+            # Serve all viewers from one event loop instead of a thread each
+            import uvicorn
+            from async_streaming import create_app
+            asgi_app = create_app({name: camera.broadcaster for name, camera in cameras.items()},
+                                  classes=class_info(), stats_fn=collect_stats,
+                                  queue_size=args.send_queue_size)
+            uvicorn.run(asgi_app, host='0.0.0.0', port=args.port, log_level='warning')
+        else:
+            # Start the Flask server
+            app.run(host='0.0.0.0', port=args.port, debug=False, threaded=True)
+    finally:
+        if worker is not None:
+            # Stop the worker and remove its shared-memory rings
+            worker.stop()
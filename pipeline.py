@@ -0,0 +1,218 @@
+import threading
+import time
+from collections import deque
+
+DROP_POLICIES = ('block', 'drop-oldest', 'drop-newest')
+
+# Queue depth between stages for each pipeline mode. Low latency keeps at
+# most one item waiting, so the source only produces a new one once the
+# stages have room; throughput keeps every stage busy and lets the slowest
+# one set the pace
+PIPELINE_MODES = {'low-latency': 1, 'throughput': 4}
+
+
+class StageQueue:
+    """Bounded queue between two pipeline stages
+
+    When the queue is full, `put()` waits for room ('block'), drops the
+    oldest waiting item to make room ('drop-oldest'), or discards the new
+    item ('drop-newest'). `on_drop(item)` is called for every item that is
+    discarded, so resources it holds can be freed. Closing the queue lets
+    the consumer finish the remaining items and then stop.
+    """
+
+    def __init__(self, name, capacity=1, policy='block', on_drop=None):
+        if policy not in DROP_POLICIES:
+            raise ValueError(f"Unknown drop policy '{policy}'")
+        self.name = name
+        self.capacity = max(1, int(capacity))
+        self.policy = policy
+        self.on_drop = on_drop
+
+        self._items = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+
+        self.items_in = 0
+        self.dropped = 0
+        self._depth_total = 0
+
+    def put(self, item):
+        """Queue an item; returns False if it was discarded"""
+        dropped = None
+        with self._cond:
+            full = len(self._items) >= self.capacity
+            if full and self.policy == 'block':
+                self._cond.wait_for(lambda: len(self._items) < self.capacity or self._closed)
+                full = False
+            if self._closed:
+                dropped = item
+            elif full:
+                dropped = item if self.policy == 'drop-newest' else self._items.popleft()
+                self.dropped += 1
+            if dropped is not item:
+                self._items.append(item)
+                self.items_in += 1
+                self._depth_total += len(self._items)
+                self._cond.notify_all()
+        if dropped is not None and self.on_drop is not None:
+            self.on_drop(dropped)
+        return dropped is not item
+
+    def get(self):
+        """Wait for the next item; returns None once the queue is closed and empty"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._items or self._closed)
+            if not self._items:
+                return None
+            item = self._items.popleft()
+            self._cond.notify_all()
+            return item
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'depth': len(self._items),
+                'capacity': self.capacity,
+                'policy': self.policy,
+                'avg_depth': self._depth_total / self.items_in if self.items_in else 0.0,
+                'items': self.items_in,
+                'dropped': self.dropped,
+            }
+
+
+class Stage:
+    """One pipeline step running on its own thread
+
+    `fn(item)` returns the item to pass on, or None to pass nothing on. The
+    first stage has no inbox: `fn()` is called repeatedly to produce items,
+    and returning None ends the pipeline. Time spent in `fn` counts as busy,
+    time waiting for room in the next queue as blocked. For the first stage,
+    busy time includes waiting for the source to produce an item. An
+    exception raised by `fn` ends the stage and is kept in `error`;
+    `on_exit(stage)` is called once the stage has ended either way.
+    """
+
+    def __init__(self, name, fn, inbox=None, outbox=None, on_exit=None):
+        self.name = name
+        self.fn = fn
+        self.inbox = inbox
+        self.outbox = outbox
+        self.on_exit = on_exit
+        self.error = None
+
+        self._thread = threading.Thread(target=self._run, name=f'{name}-stage', daemon=True)
+        self._lock = threading.Lock()
+        self._started = None
+        self.items = 0
+        self.busy = 0.0
+        self.blocked = 0.0
+
+    def start(self):
+        self._started = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def join(self, timeout=None):
+        self._thread.join(timeout)
+
+    def _run(self):
+        try:
+            while True:
+                if self.inbox is not None:
+                    item = self.inbox.get()
+                    if item is None:
+                        break
+                start = time.perf_counter()
+                result = self.fn(item) if self.inbox is not None else self.fn()
+                done = time.perf_counter()
+                if self.inbox is None and result is None:
+                    break
+                if result is not None and self.outbox is not None:
+                    self.outbox.put(result)
+                with self._lock:
+                    self.items += 1
+                    self.busy += done - start
+                    self.blocked += time.perf_counter() - done
+        except Exception as e:
+            self.error = e
+            raise
+        finally:
+            if self.outbox is not None:
+                self.outbox.close()
+            if self.on_exit is not None:
+                self.on_exit(self)
+
+    def stats(self):
+        with self._lock:
+            elapsed = time.perf_counter() - self._started if self._started else 0.0
+            return {
+                'items': self.items,
+                'avg_ms': self.busy * 1000 / self.items if self.items else 0.0,
+                'utilization': self.busy / elapsed if elapsed else 0.0,
+                'blocked': self.blocked / elapsed if elapsed else 0.0,
+            }
+
+
+class Pipeline:
+    """Run a chain of stages on their own threads, connected by bounded queues
+
+    `steps` is a list of (name, fn) pairs; the first one is the source (see
+    `Stage`). Every queue holds at most `capacity` items and applies the
+    drop `policy` when full. A capacity of 1 keeps latency lowest since
+    no item waits behind another; deeper queues absorb jitter between
+    stages and raise throughput. `on_drop(item)` is called for every item
+    a queue discards.
+
+    If a stage fails, the others are left running but `join()` returns and
+    `error` holds the exception, so the caller can stop or restart.
+    """
+
+    def __init__(self, steps, capacity=1, policy='block', on_drop=None):
+        names = [name for name, _ in steps]
+        self.queues = [StageQueue(f'{a}->{b}', capacity, policy, on_drop) for a, b in zip(names, names[1:])]
+        inboxes = [None] + self.queues
+        outboxes = self.queues + [None]
+        self.stages = [Stage(name, fn, inbox, outbox, self._stage_exited)
+                       for (name, fn), inbox, outbox in zip(steps, inboxes, outboxes)]
+
+        self.error = None
+        self._running = len(self.stages)
+        self._lock = threading.Lock()
+        self._finished = threading.Event()
+
+    def _stage_exited(self, stage):
+        with self._lock:
+            self._running -= 1
+            if stage.error is not None and self.error is None:
+                self.error = stage.error
+            if self._running == 0 or self.error is not None:
+                self._finished.set()
+
+    def start(self):
+        for stage in self.stages:
+            stage.start()
+        return self
+
+    def join(self):
+        """Wait until every stage has finished or one of them has failed"""
+        self._finished.wait()
+
+    def stats(self):
+        """Per-stage utilization and per-queue depth
+
+        The bottleneck is the busiest stage after the source; if no stage
+        is close to fully busy, the source is what limits the pipeline.
+        """
+        stages = {stage.name: stage.stats() for stage in self.stages}
+        workers = list(stages)[1:]
+        return {
+            'stages': stages,
+            'queues': {queue.name: queue.stats() for queue in self.queues},
+            'bottleneck': max(workers, key=lambda name: stages[name]['utilization']) if workers else None,
+        }
@@ -0,0 +1,128 @@
+import cv2
+import numpy as np
+
+
+def resolve_classes(names, class_filter):
+    """Map a list of class names or ids to the ids known by a model's `names` dict"""
+    if not class_filter:
+        return None
+    name_to_id = {name: idx for idx, name in names.items()}
+    ids = []
+    for item in class_filter:
+        item = str(item)
+        if item.isdigit() and int(item) in names:
+            ids.append(int(item))
+        elif item in name_to_id:
+            ids.append(name_to_id[item])
+    return ids
+
+
+def predict_kwargs(names=None, conf=None, classes=None, max_det=None):
+    """Build the filtering arguments pushed down into a model's predict call
+
+    Thresholds, class filters and the detection cap are applied inside NMS
+    so filtered boxes never reach Python.
+    """
+    kwargs = {'verbose': False}
+    if conf is not None:
+        kwargs['conf'] = conf
+    if max_det is not None:
+        kwargs['max_det'] = max_det
+    if classes:
+        # Filter names this model doesn't know are dropped; an empty list
+        # would disable the filter, so keep a sentinel id nothing matches
+        ids = resolve_classes(names or {}, classes)
+        kwargs['classes'] = ids if ids else [-1]
+    return kwargs
+
+
+class Detections:
+    """Detections of one image held as columnar NumPy arrays
+
+    `xyxy` is an (N, 4) float array of box corners, `conf` the (N,) scores and
+    `cls` the (N,) integer class ids. `names` is the model's id -> name dict.
+    `ids` holds (N,) track ids when the detections come from a tracker.
+    """
+
+    def __init__(self, xyxy, conf, cls, names=None, ids=None):
+        self.xyxy = xyxy
+        self.conf = conf
+        self.cls = cls
+        self.names = names or {}
+        self.ids = ids
+
+    @classmethod
+    def empty(cls, names=None):
+        return cls(np.zeros((0, 4), np.float32), np.zeros(0, np.float32),
+                   np.zeros(0, np.int64), names)
+
+    @classmethod
+    def from_results(cls, result):
+        """Convert an ultralytics `Results` object with one device-to-host transfer"""
+        # boxes.data is (N, 6) [x1, y1, x2, y2, conf, cls], or (N, 7) with a
+        # track id before conf when tracking is enabled
+        data = result.boxes.data.cpu().numpy()
+        ids = data[:, 4].astype(np.int64) if data.shape[1] == 7 else None
+        return cls(data[:, :4], data[:, -2], data[:, -1].astype(np.int64), result.names, ids)
+
+    def __len__(self):
+        return len(self.conf)
+
+    def __getitem__(self, index):
+        """Select a subset of detections with a boolean mask or index array"""
+        ids = self.ids[index] if self.ids is not None else None
+        return Detections(self.xyxy[index], self.conf[index], self.cls[index], self.names, ids)
+
+    def filter(self, min_conf=None, classes=None):
+        """Host-side filtering for results that were not filtered in predict"""
+        keep = np.ones(len(self), dtype=bool)
+        if min_conf is not None:
+            keep &= self.conf >= min_conf
+        if classes is not None:
+            keep &= np.isin(self.cls, classes)
+        return self[keep]
+
+    def class_names(self):
+        return [self.names.get(c, str(c)) for c in self.cls.tolist()]
+
+    def to_rows(self):
+        """Pack detections as [x1, y1, x2, y2, conf, cls] rows for compact messages"""
+        return [
+            bbox + [conf, cls]
+            for bbox, conf, cls in zip(self.xyxy.round(1).tolist(), self.conf.round(3).tolist(), self.cls.tolist())
+        ]
+
+    def to_json(self):
+        """Build the /api/detect response records from the arrays in bulk"""
+        records = [
+            {'bbox': bbox, 'confidence': conf, 'class': cls}
+            for bbox, conf, cls in zip(self.xyxy.tolist(), self.conf.tolist(), self.cls.tolist())
+        ]
+        if self.ids is not None:
+            for record, track_id in zip(records, self.ids.tolist()):
+                record['track_id'] = track_id
+        return records
+
+
+def box_iou(a, b):
+    """Pairwise IoU between (N, 4) and (M, 4) xyxy boxes as an (N, M) array"""
+    area_a = (a[:, 2] - a[:, 0]).clip(0) * (a[:, 3] - a[:, 1]).clip(0)
+    area_b = (b[:, 2] - b[:, 0]).clip(0) * (b[:, 3] - b[:, 1]).clip(0)
+    top_left = np.maximum(a[:, None, :2], b[None, :, :2])
+    bottom_right = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = (bottom_right - top_left).clip(0).prod(axis=2)
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+def draw_detections(frame, detections, class_colors, default_color=(255, 255, 255)):
+    """Draw boxes and labels from a `Detections` onto a frame in place"""
+    boxes = detections.xyxy.astype(np.int32).tolist()
+    ids = detections.ids.tolist() if detections.ids is not None else [None] * len(boxes)
+    for (x1, y1, x2, y2), conf, class_name, track_id in zip(boxes, detections.conf.tolist(),
+                                                           detections.class_names(), ids):
+        color = class_colors.get(class_name, default_color)
+        label = f"{class_name}: {conf:.2f}" if track_id is None else f"{class_name} #{track_id}: {conf:.2f}"
+        cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
+        cv2.putText(frame, label, (x1, y1 - 10),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
+    return frame
@@ -0,0 +1,87 @@
+import cv2
+import numpy as np
+import torch
+
+
+def model_input_size(model, default=640):
+    """Input size a YOLO model was trained at, as a single int"""
+    imgsz = getattr(model, 'overrides', {}).get('imgsz') or default
+    if isinstance(imgsz, (list, tuple)):
+        imgsz = max(imgsz)
+    return int(imgsz)
+
+
+def model_stride(model, default=32):
+    """Largest stride of a YOLO model; letterboxed inputs must be a multiple of it"""
+    stride = getattr(getattr(model, 'model', None), 'stride', None)
+    if stride is None:
+        return default
+    return int(max(stride.tolist() if hasattr(stride, 'tolist') else stride))
+
+
+class SharedPreprocessor:
+    """Letterbox a BGR frame once into a reusable normalized RGB CHW tensor
+
+    The output tensor can be passed straight to several models with the same
+    input size, which then skip their own resize, colour conversion,
+    transpose and normalization. Boxes predicted on the tensor are mapped
+    back to frame coordinates with `scale()`.
+    """
+
+    def __init__(self, imgsz=640, stride=32, pad_value=114):
+        self.imgsz = imgsz
+        self.stride = stride
+        self.pad_value = pad_value
+
+        self._frame_shape = None
+        self.gain = 1.0
+        self.pad = (0, 0)
+
+    def _allocate(self, frame_shape):
+        """Work out the letterbox geometry and buffers for a new frame size"""
+        h, w = frame_shape[:2]
+        self.gain = min(self.imgsz / h, self.imgsz / w)
+        new_w, new_h = int(round(w * self.gain)), int(round(h * self.gain))
+
+        # Minimal padding up to the next multiple of the stride
+        out_w = int(np.ceil(new_w / self.stride) * self.stride)
+        out_h = int(np.ceil(new_h / self.stride) * self.stride)
+        left, top = (out_w - new_w) // 2, (out_h - new_h) // 2
+        self.pad = (left, top)
+
+        self._resize_size = (new_w, new_h)
+        self._resized = np.empty((new_h, new_w, 3), np.uint8)
+        self._canvas = np.full((out_h, out_w, 3), self.pad_value, np.uint8)
+        self._canvas_view = self._canvas[top:top + new_h, left:left + new_w]
+        self._buffer = np.empty((1, 3, out_h, out_w), np.float32)
+        self.tensor = torch.from_numpy(self._buffer)
+        self._frame_shape = frame_shape
+
+    def __call__(self, frame):
+        """Preprocess a frame into the shared tensor and return it"""
+        if frame.shape != self._frame_shape:
+            self._allocate(frame.shape)
+
+        if self._resize_size == (frame.shape[1], frame.shape[0]):
+            self._canvas_view[...] = frame
+        else:
+            cv2.resize(frame, self._resize_size, dst=self._resized, interpolation=cv2.INTER_LINEAR)
+            self._canvas_view[...] = self._resized
+
+        # BGR -> RGB, HWC -> CHW and 0-255 -> 0-1 in one pass per channel
+        for channel in range(3):
+            np.multiply(self._canvas[..., 2 - channel], 1 / 255.0,
+                        out=self._buffer[0, channel], casting='unsafe')
+        return self.tensor
+
+    def scale(self, detections):
+        """Map boxes from the letterboxed tensor back onto the original frame"""
+        if not len(detections):
+            return detections
+        left, top = self.pad
+        xyxy = (detections.xyxy - np.array([left, top, left, top], np.float32)) / self.gain
+        h, w = self._frame_shape[:2]
+        xyxy[:, [0, 2]] = xyxy[:, [0, 2]].clip(0, w)
+        xyxy[:, [1, 3]] = xyxy[:, [1, 3]].clip(0, h)
+        detections.xyxy = xyxy
+        return detections
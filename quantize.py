@@ -0,0 +1,182 @@
+import argparse
+import os
+import shutil
+import time
+from pathlib import Path
+
+import cv2
+from ultralytics import YOLO
+
+from backends import check_backend, export_model, exported_path
+from preprocess import SharedPreprocessor, model_input_size
+
+# Parse command line arguments
+parser = argparse.ArgumentParser(description='Quantize YOLO detectors to INT8 for CPU inference')
+parser.add_argument('--weights', type=str, nargs='+', default=['./model1.pt', './model2.pt'],
+                    help='PyTorch weights to quantize')
+parser.add_argument('--calib-dir', type=str, required=True,
+                    help='Folder of representative images used to calibrate activation ranges')
+parser.add_argument('--calib-images', type=int, default=300, help='Maximum number of calibration images')
+parser.add_argument('--backend', type=str, default='onnx', choices=['onnx', 'openvino'],
+                    help='CPU backend to produce the INT8 model for')
+parser.add_argument('--data', type=str, default=None,
+                    help='Dataset YAML with a labelled val split, used to compare INT8 and FP32 accuracy')
+parser.add_argument('--quantize-head', action='store_true',
+                    help='Also quantize the detection head (faster, usually less accurate)')
+parser.add_argument('--bench-runs', type=int, default=50, help='Timed runs for the latency comparison')
+parser.add_argument('--force', action='store_true', help='Quantize again even if an INT8 model exists')
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+
+def calibration_images(folder, limit):
+    """Paths of up to `limit` images from `folder`, spread evenly over the sorted list"""
+    paths = sorted(p for p in Path(folder).rglob('*') if p.suffix.lower() in IMAGE_EXTENSIONS)
+    if not paths:
+        raise FileNotFoundError(f"No images found in {folder}")
+    step = max(1, len(paths) // limit)
+    return [str(p) for p in paths[::step][:limit]]
+
+
+def calibration_batches(paths, imgsz):
+    """Yield each calibration image as a letterboxed (1, 3, imgsz, imgsz) float array"""
+    # A stride equal to the input size pads every image to the full square
+    # input, as ultralytics does for exported models
+    preprocessor = SharedPreprocessor(imgsz, stride=imgsz)
+    for path in paths:
+        image = cv2.imread(path)
+        if image is None:
+            print(f"Skipping unreadable image {path}")
+            continue
+        yield preprocessor(image).numpy().copy()
+
+
+def detect_head_prefix(weights):
+    """Name prefix of the detection head's nodes in the exported graph"""
+    layers = YOLO(weights).model.model
+    return f"/model.{len(layers) - 1}/"
+
+
+def quantize_onnx(weights, fp32_path, target, paths, imgsz, quantize_head):
+    import onnx
+    from onnxruntime.quantization import (CalibrationDataReader, CalibrationMethod, QuantFormat,
+                                          QuantType, quantize_static)
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    class Reader(CalibrationDataReader):
+        def __init__(self, input_name):
+            self.input_name = input_name
+            self.batches = calibration_batches(paths, imgsz)
+
+        def get_next(self):
+            batch = next(self.batches, None)
+            return None if batch is None else {self.input_name: batch}
+
+    fp32 = onnx.load(fp32_path)
+    input_name = fp32.graph.input[0].name
+    exclude = []
+    if not quantize_head:
+        prefix = detect_head_prefix(weights)
+        exclude = [node.name for node in fp32.graph.node if node.name.startswith(prefix)]
+
+    prepared = f"{target}.prep.onnx"
+    quant_pre_process(fp32_path, prepared, skip_symbolic_shape=True)
+    try:
+        quantize_static(prepared, target, Reader(input_name),
+                        quant_format=QuantFormat.QDQ,
+                        per_channel=True,
+                        activation_type=QuantType.QUInt8,
+                        weight_type=QuantType.QInt8,
+                        calibrate_method=CalibrationMethod.MinMax,
+                        nodes_to_exclude=exclude)
+    finally:
+        os.remove(prepared)
+
+    # Keep the class names and other metadata ultralytics reads on load
+    int8 = onnx.load(target)
+    del int8.metadata_props[:]
+    int8.metadata_props.extend(fp32.metadata_props)
+    onnx.save(int8, target)
+
+
+def quantize_openvino(weights, fp32_path, target, paths, imgsz, quantize_head):
+    import nncf
+    import openvino as ov
+
+    fp32_xml = next(Path(fp32_path).glob('*.xml'))
+    model = ov.Core().read_model(fp32_xml)
+    ignored_scope = None
+    if not quantize_head:
+        prefix = detect_head_prefix(weights)
+        ignored_scope = nncf.IgnoredScope(patterns=[f"{prefix}.*"], validate=False)
+
+    dataset = nncf.Dataset(list(calibration_batches(paths, imgsz)))
+    quantized = nncf.quantize(model, dataset, preset=nncf.QuantizationPreset.MIXED,
+                              subset_size=len(paths), ignored_scope=ignored_scope)
+
+    os.makedirs(target, exist_ok=True)
+    ov.save_model(quantized, os.path.join(target, fp32_xml.name))
+    # Keep the class names and other metadata ultralytics reads on load
+    shutil.copy(os.path.join(fp32_path, 'metadata.yaml'), target)
+
+
+def mean_latency(model, paths, runs):
+    """Mean single-image predict time in ms over `runs` calls, after a warm-up"""
+    images = [cv2.imread(path) for path in paths[:runs]]
+    images = [image for image in images if image is not None]
+    model(images[0], verbose=False)
+    start = time.perf_counter()
+    for i in range(runs):
+        model(images[i % len(images)], verbose=False)
+    return (time.perf_counter() - start) * 1000 / runs
+
+
+def accuracy(model, data, imgsz):
+    """mAP50 and mAP50-95 of a model on the dataset's val split"""
+    metrics = model.val(data=data, imgsz=imgsz, batch=1, plots=False, verbose=False)
+    return metrics.box.map50, metrics.box.map
+
+
+def quantize(weights, args):
+    imgsz = model_input_size(YOLO(weights))
+    fp32_path = export_model(weights, args.backend, imgsz)
+    check_backend(weights, fp32_path, imgsz)
+    target = exported_path(weights, f"{args.backend}-int8", imgsz)
+
+    if os.path.exists(target) and not args.force:
+        print(f"Using existing INT8 model {target}")
+    else:
+        paths = calibration_images(args.calib_dir, args.calib_images)
+        print(f"Calibrating {weights} on {len(paths)} images...")
+        if args.backend == 'onnx':
+            quantize_onnx(weights, fp32_path, target, paths, imgsz, args.quantize_head)
+        else:
+            quantize_openvino(weights, fp32_path, target, paths, imgsz, args.quantize_head)
+        print(f"Saved INT8 model to {target}")
+
+    # Compare against the FP32 export of the same backend
+    paths = calibration_images(args.calib_dir, args.bench_runs)
+    models = {'fp32': YOLO(fp32_path, task='detect'), 'int8': YOLO(target, task='detect')}
+    report = {}
+    for name, model in models.items():
+        model.overrides['imgsz'] = imgsz
+        report[name] = {'latency_ms': mean_latency(model, paths, args.bench_runs)}
+        if args.data:
+            report[name]['map50'], report[name]['map'] = accuracy(model, args.data, imgsz)
+
+    fp32, int8 = report['fp32'], report['int8']
+    print(f"\n{weights} ({args.backend})")
+    print(f"  latency  fp32 {fp32['latency_ms']:.1f} ms  int8 {int8['latency_ms']:.1f} ms  "
+          f"speedup {fp32['latency_ms'] / int8['latency_ms']:.2f}x")
+    if args.data:
+        for key in ('map50', 'map'):
+            print(f"  {key:<7}  fp32 {fp32[key]:.4f}  int8 {int8[key]:.4f}  "
+                  f"delta {int8[key] - fp32[key]:+.4f}")
+    print(f"  load with --backend {args.backend}-int8")
+    return report
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    for weights in args.weights:
+        quantize(weights, args)
@@ -1,8 +1,15 @@
 import cv2
 import time
 import threading
-from flask import Flask, Response, render_template_string
-from ultralytics import YOLO
+from flask import Flask, Response, jsonify, render_template_string
+from backends import BACKENDS, load_model
+from postprocess import draw_detections, predict_kwargs
+from dual_model import DualModelRunner
+from frame_sources import LatestFrameReader, open_source
+from frame_gate import MotionGate
+from tracking import IoUTracker
+from fusion import DetectionFusion, parse_name_map
+from streaming import FrameBroadcaster
 import socket
 import argparse
 
@@ -11,12 +18,56 @@ parser = argparse.ArgumentParser(description='Object Detection with Web Server')
 parser.add_argument('--port', type=int, default=5000, help='Port for the web server')
 parser.add_argument('--model1', type=str, default="./model1.pt", help='Path to the first YOLO model')
 parser.add_argument('--model2', type=str, default="./model2.pt", help='Path to the second YOLO model')
+parser.add_argument('--backend', type=str, default='pytorch', choices=list(BACKENDS),
+                    help='Run the models with PyTorch, or exported to ONNX Runtime or OpenVINO')
+parser.add_argument('--no-backend-check', action='store_true',
+                    help='Skip comparing an exported model\'s outputs with PyTorch at startup')
+parser.add_argument('--source', type=str, default='0',
+                    help='Camera index, video file, image directory, rtsp:// or http:// URL, '
+                         'or synthetic[:WxH[@FPS]] for generated frames')
+parser.add_argument('--loop', action='store_true', help='Restart a video file or image directory at the end')
+parser.add_argument('--no-realtime', action='store_true',
+                    help='Read files and generated frames as fast as possible instead of at their frame rate')
+parser.add_argument('--source-fps', type=float, default=None,
+                    help='Playback rate of an image directory or synthetic source')
 parser.add_argument('--conf', type=float, default=0.5, help='Confidence threshold')
+parser.add_argument('--classes', type=str, nargs='+', help='Only detect these class names or ids')
+parser.add_argument('--max-det', type=int, default=300, help='Maximum detections per model per frame')
+parser.add_argument('--inference-mode', type=str, default='parallel', choices=['parallel', 'sequential', 'cascade'],
+                    help='Run the two models concurrently, one after the other, or the second only when the first is unsure')
+parser.add_argument('--cascade-band', type=float, nargs=2, default=[0.25, 0.6], metavar=('LOW', 'HIGH'),
+                    help='Small-model confidences in [LOW, HIGH) escalate to the medium model in cascade mode')
+parser.add_argument('--cascade-crops', action='store_true',
+                    help='In cascade mode, run the medium model only on crops around uncertain boxes')
+parser.add_argument('--escalate-empty', action='store_true',
+                    help='In cascade mode, escalate frames where the small model finds nothing '
+                         '(only frames with motion when --gate is on)')
+parser.add_argument('--fusion', type=str, default='nms', choices=['none', 'nms', 'wbf'],
+                    help='Merge the two models\' overlapping boxes by class-aware NMS or weighted box fusion')
+parser.add_argument('--fusion-iou', type=float, default=0.5, help='IoU above which boxes are fused')
+parser.add_argument('--class-map', type=str, nargs='+', metavar='SOURCE=TARGET',
+                    help='Treat class SOURCE of either model as class TARGET when fusing')
+parser.add_argument('--gate', action='store_true', help='Skip inference on static or blurry frames')
+parser.add_argument('--motion-threshold', type=float, default=0.005,
+                    help='Fraction of changed pixels that counts as motion when gating')
+parser.add_argument('--blur-threshold', type=float, default=0.0,
+                    help='Minimum sharpness (Laplacian variance) to run inference when gating, 0 to disable')
+parser.add_argument('--gate-refresh', type=float, default=5.0,
+                    help='Seconds after which a static scene is inferred again when gating')
+parser.add_argument('--track-every', type=int, default=0,
+                    help='Run the detectors every N frames and track boxes in between (0 to detect every frame)')
+parser.add_argument('--redetect-conf', type=float, default=0.0,
+                    help='Detect early when a tracked box is less confident than this')
+parser.add_argument('--jpeg-quality', type=int, default=95, help='JPEG quality of the video stream')
+parser.add_argument('--no-shared-preprocess', action='store_true',
+                    help='Let each model preprocess the frame itself')
+parser.add_argument('--threads-per-model', type=int, default=None,
+                    help='Intra-op threads for each model in parallel mode (default: half the cores)')
 args = parser.parse_args()
 
 # Load models
-model_s = YOLO(args.model1)
-model_m = YOLO(args.model2)
+model_s = load_model(args.model1, args.backend, check=not args.no_backend_check)
+model_m = load_model(args.model2, args.backend, check=not args.no_backend_check)
 
 # Define colors for each class (Total: 8 classes)
 CLASS_COLORS = {
@@ -33,9 +84,35 @@ CLASS_COLORS = {
 # Confidence threshold
 CONF_THRESHOLD = args.conf
 
-# Global variable for the latest processed frame
-global_frame = None
-frame_lock = threading.Lock()
+# Filtering arguments pushed down into each model's predict call
+PREDICT_KWARGS_S = predict_kwargs(model_s.names, conf=CONF_THRESHOLD, classes=args.classes, max_det=args.max_det)
+PREDICT_KWARGS_M = predict_kwargs(model_m.names, conf=CONF_THRESHOLD, classes=args.classes, max_det=args.max_det)
+
+# Runs both models on each frame and keeps per-model timings
+runner = DualModelRunner(model_s, model_m, PREDICT_KWARGS_S, PREDICT_KWARGS_M,
+                         mode=args.inference_mode,
+                         threads_per_model=args.threads_per_model,
+                         shared_preprocess=not args.no_shared_preprocess,
+                         band_low=args.cascade_band[0], band_high=args.cascade_band[1],
+                         crop_escalation=args.cascade_crops)
+
+# Optional fusion of both models' boxes into one deduplicated set
+fusion = DetectionFusion(args.fusion, args.fusion_iou, parse_name_map(args.class_map)) if args.fusion != 'none' else None
+
+# Optional gate that reuses the last detections on static or blurry frames
+gate = MotionGate(motion_threshold=args.motion_threshold, blur_threshold=args.blur_threshold,
+                  refresh_interval=args.gate_refresh) if args.gate else None
+
+# Optional tracker that propagates boxes between detection frames
+tracker = IoUTracker(detect_every=args.track_every, redetect_conf=args.redetect_conf) if args.track_every > 0 else None
+
+# Latest processed frame, JPEG-encoded once and shared with all viewers
+broadcaster = FrameBroadcaster(jpeg_quality=args.jpeg_quality)
+
+# Capture thread feeding process_webcam, and how far behind capture the
+# last processed frame was
+frame_reader = None
+capture_lag = 0.0
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -135,56 +212,56 @@ def get_local_ip():
         return "127.0.0.1"
 
 def process_webcam():
-    """Process webcam feed and perform object detection"""
-    global global_frame
+    """Process the frame source (webcam by default) and perform object detection"""
+    global frame_reader, capture_lag
     
-    # Initialize webcam
-    cap = cv2.VideoCapture(0, cv2.CAP_DSHOW)
+    # Open the frame source (webcam by default)
+    cap = open_source(args.source, loop=args.loop, realtime=not args.no_realtime, fps=args.source_fps)
+    if not cap.isOpened():
+        print(f"Could not open frame source {args.source}")
+        return
+    
+    # Read frames on their own thread so inference always gets the newest one
+    frame_reader = LatestFrameReader(cap).start()
+    last_seq = -1
     
     # For FPS calculation
     prev_time = time.time()
     fps = 0
+    detections = []
     
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
+    while True:
+        latest = frame_reader.read(last_seq)
+        if latest is None:
             break
+        last_seq, captured_at, buffer = latest
+        # Only look at the pooled frame until it's time to draw on it
+        frame = buffer.view()
         
         # Start time for FPS
         current_time = time.time()
         
-        # Inference with both models
-        results_s = model_s(frame)[0]
-        results_m = model_m(frame)[0]
+        # Inference with both models, collecting boxes as columnar arrays.
+        # Static or blurry frames keep the previous detections, and in
+        # tracking mode the frames between detections only move the tracks.
+        if (tracker is None or tracker.due()) and (gate is None or gate.should_infer(frame)):
+            interesting = args.escalate_empty and (gate is None or gate.last_reason == 'motion')
+            detections = runner.run(frame, interesting=interesting)
+            if fusion is not None:
+                detections = [fusion(detections)]
+            if tracker is not None:
+                detections = [tracker.update(detections)]
+        elif tracker is not None:
+            detections = [tracker.predict()]
         
-        # Prepare annotated frame
-        annotated_frame = frame.copy()
-        
-        # Collect boxes from both models
-        detections = []
-        for results, model in [(results_s, model_s), (results_m, model_m)]:
-            for box in results.boxes:
-                if box.conf.item() >= CONF_THRESHOLD:
-                    x1, y1, x2, y2 = map(int, box.xyxy[0])
-                    conf = float(box.conf)
-                    cls = int(box.cls)
-                    class_name = model.names[cls]
-                    color = CLASS_COLORS.get(class_name, (255, 255, 255))  # Default white
-                    detections.append({
-                        'box': (x1, y1, x2, y2),
-                        'conf': conf,
-                        'class_name': class_name,
-                        'color': color
-                    })
+        # Draw on the captured frame, or on a pooled copy if the capture
+        # thread still holds it
+        buffer = buffer.writable()
+        annotated_frame = buffer.array
         
         # Draw all detections
         for det in detections:
-            x1, y1, x2, y2 = det['box']
-            label = f"{det['class_name']}: {det['conf']:.2f}"
-            color = det['color']
-            cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), color, 2)
-            cv2.putText(annotated_frame, label, (x1, y1 - 10),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
+            draw_detections(annotated_frame, det, CLASS_COLORS)
         
         # Calculate FPS
         fps = 1 / (current_time - prev_time)
@@ -193,36 +270,22 @@ def process_webcam():
         # Draw FPS on frame
         cv2.putText(annotated_frame, f'FPS: {fps:.2f}', (20, 40),
                     cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+        cv2.putText(annotated_frame, runner.timing_text(), (20, 70),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
         
-        # Update the global frame with the annotated frame
-        with frame_lock:
-            global_frame = annotated_frame.copy()
+        # Publish the annotated frame to the stream viewers
+        broadcaster.publish(buffer, detections, captured_at)
+        capture_lag = time.time() - captured_at
         
         # No local display - removed cv2.imshow to ensure web-only interface
         
+    frame_reader.stop()
     cap.release()
 
 def generate_frames():
     """Generate frames for streaming"""
-    global global_frame
-    
-    while True:
-        # Ensure we have a frame to send
-        with frame_lock:
-            if global_frame is None:
-                continue
-            frame_to_send = global_frame.copy()
-        
-        # Encode the frame for streaming
-        _, buffer = cv2.imencode('.jpg', frame_to_send)
-        frame_bytes = buffer.tobytes()
-        
-        # Yield the frame in the format expected by Flask's Response
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-        
-        # Add a small delay to control streaming rate
-        time.sleep(0.03)  # ~30 FPS
+    # Each viewer waits for new frames instead of re-encoding the same one
+    return broadcaster.stream()
 
 @app.route('/')
 def index():
@@ -241,6 +304,20 @@ def video_feed():
     return Response(generate_frames(), 
                     mimetype='multipart/x-mixed-replace; boundary=frame')
 
+@app.route('/stats')
+def stats():
+    """Get pipeline timing statistics"""
+    capture = frame_reader.stats() if frame_reader else {}
+    capture['lag_ms'] = capture_lag * 1000
+    stats = {'inference': runner.stats(), 'capture': capture, 'stream': broadcaster.stats()}
+    if gate is not None:
+        stats['gate'] = gate.stats()
+    if fusion is not None:
+        stats['fusion'] = fusion.stats()
+    if tracker is not None:
+        stats['tracking'] = tracker.stats()
+    return jsonify(stats)
+
 if __name__ == "__main__":
     # Start webcam processing in a separate thread
     webcam_thread = threading.Thread(target=process_webcam, daemon=True)
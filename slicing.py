@@ -0,0 +1,130 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import torch
+from torchvision.ops import batched_nms
+
+from postprocess import Detections
+
+SLICE_MODES = ('off', 'tiles', 'hybrid')
+
+
+def tile_windows(height, width, tile_size=640, overlap=0.2):
+    """Overlapping xyxy tile windows covering an image, as an (N, 4) integer array
+
+    Tiles are `tile_size` squares spaced so neighbours overlap by at least
+    `overlap` of a tile; the last row and column are aligned to the image edge.
+    Images smaller than a tile get a single window covering the whole image.
+    """
+    step = max(1, int(tile_size * (1 - overlap)))
+
+    def starts(size):
+        if size <= tile_size:
+            return np.zeros(1, np.int64)
+        return np.unique(np.append(np.arange(0, size - tile_size, step), size - tile_size))
+
+    ys, xs = np.meshgrid(starts(height), starts(width), indexing='ij')
+    x1, y1 = xs.ravel(), ys.ravel()
+    return np.stack([x1, y1, np.minimum(x1 + tile_size, width), np.minimum(y1 + tile_size, height)], axis=1)
+
+
+class SlicedDetector:
+    """Detect small objects in large images by running the model on overlapping tiles
+
+    `predict_fn` takes a list of BGR images and returns one ultralytics
+    `Results` per image. Tiles are sent in batches of `batch_size`, across
+    `workers` threads if more than one (`predict_fn` must then be thread-safe,
+    for example backed by a MicroBatcher). In 'hybrid' mode the full frame is
+    run alongside the tiles so large objects cut by tile borders are still
+    found. Boxes from all tiles are shifted back into image coordinates and
+    merged with class-aware NMS.
+    """
+
+    def __init__(self, predict_fn, tile_size=640, overlap=0.2, mode='tiles', batch_size=8, workers=1,
+                 iou_threshold=0.5):
+        if mode not in SLICE_MODES[1:]:
+            raise ValueError(f"Unknown slicing mode '{mode}'")
+        self.predict_fn = predict_fn
+        self.tile_size = tile_size
+        self.overlap = overlap
+        self.mode = mode
+        self.batch_size = max(1, int(batch_size))
+        self.workers = max(1, int(workers))
+        self.iou_threshold = iou_threshold
+
+        self._pool = ThreadPoolExecutor(self.workers) if self.workers > 1 else None
+        self._lock = threading.Lock()
+        self.images = 0
+        self.tiles = 0
+        self.batches = 0
+        self.batch_time = 0.0
+        self.last_timings = {}
+
+    def _run_batch(self, images):
+        start = time.perf_counter()
+        results = self.predict_fn(images)
+        return [Detections.from_results(result) for result in results], time.perf_counter() - start
+
+    def __call__(self, frame, mode=None):
+        """Run sliced inference on one image and return the merged `Detections`"""
+        mode = mode or self.mode
+        start = time.perf_counter()
+        h, w = frame.shape[:2]
+        windows = tile_windows(h, w, self.tile_size, self.overlap)
+        if mode == 'hybrid' and len(windows) > 1:
+            windows = np.concatenate([np.array([[0, 0, w, h]]), windows])
+        images = [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in windows.tolist()]
+
+        batches = [images[i:i + self.batch_size] for i in range(0, len(images), self.batch_size)]
+        if self._pool is not None:
+            outputs = list(self._pool.map(self._run_batch, batches))
+        else:
+            outputs = [self._run_batch(batch) for batch in batches]
+        parts = [dets for batch_dets, _ in outputs for dets in batch_dets]
+        batch_ms = [seconds * 1000 for _, seconds in outputs]
+
+        merge_start = time.perf_counter()
+        detections = self._merge(parts, windows)
+        timings = {
+            'mode': mode,
+            'tiles': len(images),
+            'batch_ms': batch_ms,
+            'merge_ms': (time.perf_counter() - merge_start) * 1000,
+            'total_ms': (time.perf_counter() - start) * 1000,
+        }
+        with self._lock:
+            self.images += 1
+            self.tiles += len(images)
+            self.batches += len(batches)
+            self.batch_time += sum(batch_ms) / 1000
+            self.last_timings = timings
+        return detections, timings
+
+    def _merge(self, parts, windows):
+        """Shift tile boxes into image coordinates and drop duplicates across tiles"""
+        names = parts[0].names if parts else {}
+        counts = [len(part) for part in parts]
+        if not sum(counts):
+            return Detections.empty(names)
+        offsets = np.repeat(windows[:, [0, 1, 0, 1]], counts, axis=0).astype(np.float32)
+        xyxy = np.concatenate([part.xyxy for part in parts]).astype(np.float32) + offsets
+        conf = np.concatenate([part.conf for part in parts]).astype(np.float32)
+        cls = np.concatenate([part.cls for part in parts])
+        keep = batched_nms(torch.from_numpy(xyxy), torch.from_numpy(conf), torch.from_numpy(cls),
+                           self.iou_threshold).numpy()
+        return Detections(xyxy[keep], conf[keep], cls[keep], names)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'mode': self.mode,
+                'tile_size': self.tile_size,
+                'overlap': self.overlap,
+                'images': self.images,
+                'tiles': self.tiles,
+                'batches': self.batches,
+                'avg_batch_ms': self.batch_time * 1000 / self.batches if self.batches else 0.0,
+                'last': self.last_timings,
+            }
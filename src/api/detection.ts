@@ -1,6 +1,7 @@
 import axios from 'axios';
 
 const API_URL = process.env.REACT_APP_API_URL || 'http://localhost:5000';
+const WS_URL = API_URL.replace(/^http/, 'ws');
 
 export const detectObjects = async (imageData: string) => {
   try {
@@ -12,4 +13,30 @@ export const detectObjects = async (imageData: string) => {
     console.error('Error detecting objects:', error);
     throw error;
   }
-}; 
\ No newline at end of file
+};
+
+// [x1, y1, x2, y2, confidence, class]
+export type DetectionRow = [number, number, number, number, number, number];
+
+export interface DetectionMessage {
+  frame: number;
+  boxes?: DetectionRow[];
+  error?: string;
+}
+
+// Persistent connection to /api/detect/ws. Frames are sent as binary JPEG
+// blobs; the server keeps at most one frame in flight per connection and
+// replies with the detections of the newest frame it received.
+export const openDetectionSocket = (
+  onDetections: (message: DetectionMessage) => void
+) => {
+  const socket = new WebSocket(`${WS_URL}/api/detect/ws`);
+  socket.binaryType = 'arraybuffer';
+  socket.onmessage = (event) => {
+    onDetections(JSON.parse(event.data));
+  };
+  socket.onerror = (error) => {
+    console.error('Detection socket error:', error);
+  };
+  return socket;
+};
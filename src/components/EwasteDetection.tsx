@@ -1,18 +1,27 @@
 import React, { useState, useRef, useEffect } from 'react';
 import { Box, Button, Typography, Paper } from '@mui/material';
-import { detectObjects } from '../api/detection';
+import { openDetectionSocket, DetectionRow } from '../api/detection';
 
 const EwasteDetection: React.FC = () => {
   const [isDetecting, setIsDetecting] = useState(false);
   const videoRef = useRef<HTMLVideoElement>(null);
   const canvasRef = useRef<HTMLCanvasElement>(null);
   const streamRef = useRef<MediaStream | null>(null);
+  const socketRef = useRef<WebSocket | null>(null);
+  const animationRef = useRef<number | null>(null);
+  // Latest detections received, and whether a frame is waiting for its reply
+  const boxesRef = useRef<DetectionRow[]>([]);
+  const awaitingRef = useRef(false);
 
   useEffect(() => {
     return () => {
       if (streamRef.current) {
         streamRef.current.getTracks().forEach(track => track.stop());
       }
+      socketRef.current?.close();
+      if (animationRef.current !== null) {
+        cancelAnimationFrame(animationRef.current);
+      }
     };
   }, []);
 
@@ -23,7 +32,18 @@ const EwasteDetection: React.FC = () => {
         videoRef.current.srcObject = stream;
         streamRef.current = stream;
         setIsDetecting(true);
-        detectObjects();
+
+        const socket = openDetectionSocket((message) => {
+          awaitingRef.current = false;
+          if (message.boxes) {
+            boxesRef.current = message.boxes;
+          }
+        });
+        socket.onclose = () => {
+          awaitingRef.current = false;
+        };
+        socketRef.current = socket;
+        animationRef.current = requestAnimationFrame(detectionLoop);
       }
     } catch (err) {
       console.error('Error accessing webcam:', err);
@@ -35,11 +55,19 @@ const EwasteDetection: React.FC = () => {
       streamRef.current.getTracks().forEach(track => track.stop());
       streamRef.current = null;
     }
+    socketRef.current?.close();
+    socketRef.current = null;
+    if (animationRef.current !== null) {
+      cancelAnimationFrame(animationRef.current);
+      animationRef.current = null;
+    }
+    boxesRef.current = [];
+    awaitingRef.current = false;
     setIsDetecting(false);
   };
 
-  const detectObjects = async () => {
-    if (!videoRef.current || !canvasRef.current || !isDetecting) return;
+  const detectionLoop = () => {
+    if (!videoRef.current || !canvasRef.current || !streamRef.current) return;
 
     const video = videoRef.current;
     const canvas = canvasRef.current;
@@ -48,49 +76,47 @@ const EwasteDetection: React.FC = () => {
     if (!context) return;
 
     // Set canvas dimensions to match video
-    canvas.width = video.videoWidth;
-    canvas.height = video.videoHeight;
+    if (canvas.width !== video.videoWidth || canvas.height !== video.videoHeight) {
+      canvas.width = video.videoWidth;
+      canvas.height = video.videoHeight;
+    }
 
     // Draw video frame
     context.drawImage(video, 0, 0, canvas.width, canvas.height);
 
-    try {
-      // Get image data from canvas
-      const imageData = canvas.toDataURL('image/jpeg');
-      
-      // Send to API for detection
-      const response = await detectObjects(imageData);
-      
-      // Clear previous drawings
-      context.clearRect(0, 0, canvas.width, canvas.height);
-      context.drawImage(video, 0, 0, canvas.width, canvas.height);
-
-      // Draw detection boxes
-      response.detections.forEach((detection: any) => {
-        const [x1, y1, x2, y2] = detection.bbox;
-        const confidence = detection.confidence;
-        const className = detection.class;
-
-        // Draw bounding box
-        context.strokeStyle = '#00FF00';
-        context.lineWidth = 2;
-        context.strokeRect(x1, y1, x2 - x1, y2 - y1);
-
-        // Draw label
-        context.fillStyle = '#00FF00';
-        context.font = '16px Arial';
-        context.fillText(
-          `Class ${className} (${(confidence * 100).toFixed(1)}%)`,
-          x1,
-          y1 - 5
-        );
-      });
-    } catch (error) {
-      console.error('Error in detection:', error);
+    // Send the next frame only once the previous one has been answered, so
+    // the overlay keeps running at display rate while detection catches up
+    const socket = socketRef.current;
+    if (socket && socket.readyState === WebSocket.OPEN && !awaitingRef.current && canvas.width) {
+      awaitingRef.current = true;
+      canvas.toBlob((blob) => {
+        if (blob && socket.readyState === WebSocket.OPEN) {
+          socket.send(blob);
+        } else {
+          awaitingRef.current = false;
+        }
+      }, 'image/jpeg', 0.8);
     }
 
+    // Draw the most recent detection boxes
+    boxesRef.current.forEach(([x1, y1, x2, y2, confidence, className]) => {
+      // Draw bounding box
+      context.strokeStyle = '#00FF00';
+      context.lineWidth = 2;
+      context.strokeRect(x1, y1, x2 - x1, y2 - y1);
+
+      // Draw label
+      context.fillStyle = '#00FF00';
+      context.font = '16px Arial';
+      context.fillText(
+        `Class ${className} (${(confidence * 100).toFixed(1)}%)`,
+        x1,
+        y1 - 5
+      );
+    });
+
     // Continue detection loop
-    requestAnimationFrame(detectObjects);
+    animationRef.current = requestAnimationFrame(detectionLoop);
   };
 
   return (
@@ -0,0 +1,162 @@
+import json
+import threading
+import time
+
+import cv2
+
+from frame_pool import FrameBuffer
+
+
+class FrameBroadcaster:
+    """Share the latest annotated frame with every stream viewer
+
+    Each published frame is JPEG-encoded at most once, by whichever viewer
+    asks for it first, and only if someone is watching. Viewers block on a
+    condition until a frame with a newer sequence number arrives, so the same
+    frame is never sent twice and nothing spins while the stream is idle.
+    The detections of each frame are serialized to JSON the same way.
+    """
+
+    def __init__(self, jpeg_quality=95):
+        self.encode_params = [int(cv2.IMWRITE_JPEG_QUALITY), int(jpeg_quality)]
+
+        self._cond = threading.Condition()
+        self._frame = None
+        self._buffer = None
+        self._detections = None
+        self._records = None
+        self._timestamp = 0.0
+        self._seq = -1
+
+        self._encode_lock = threading.Lock()
+        self._jpeg = None
+        self._jpeg_seq = -1
+        self._json = None
+        self._json_seq = -1
+
+        self.frames_published = 0
+        self.frames_encoded = 0
+        self.frames_sent = 0
+        self.viewers = 0
+
+    def publish(self, frame, detections=None, timestamp=None, records=None):
+        """Make a new annotated frame the latest one; the caller must not modify it afterwards
+
+        `frame` is an array or a `FrameBuffer`, whose reference passes to
+        the broadcaster and is released when a newer frame replaces it.
+        `detections` is the list of `Detections` drawn on the frame, or
+        `records` the same detections already converted by
+        `detection_records()`.
+        """
+        buffer = frame if isinstance(frame, FrameBuffer) else None
+        with self._cond:
+            previous = self._buffer
+            self._buffer = buffer
+            self._frame = buffer.array if buffer else frame
+            self._detections = detections or []
+            self._records = records
+            self._timestamp = timestamp or time.time()
+            self._seq += 1
+            self.frames_published += 1
+            self._cond.notify_all()
+        if previous is not None:
+            previous.release()
+
+    @property
+    def seq(self):
+        return self._seq
+
+    def wait(self, last_seq=-1, timeout=None):
+        """Wait for a frame newer than `last_seq` and return its seq, or None on timeout"""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._seq > last_seq, timeout):
+                return None
+            return self._seq
+
+    def jpeg(self):
+        """Return (seq, jpeg bytes) of the latest frame, encoding it if nobody has yet"""
+        with self._encode_lock:
+            with self._cond:
+                seq, frame = self._seq, self._frame
+                # Keep a pooled frame from being reused while it is encoded
+                buffer = self._buffer.retain() if self._jpeg_seq != seq and self._buffer else None
+            try:
+                if self._jpeg_seq != seq:
+                    _, encoded = cv2.imencode('.jpg', frame, self.encode_params)
+                    self._jpeg = encoded.tobytes()
+                    self._jpeg_seq = seq
+                    self.frames_encoded += 1
+            finally:
+                if buffer is not None:
+                    buffer.release()
+            return self._jpeg_seq, self._jpeg
+
+    def detections_json(self):
+        """Return (seq, JSON text) describing the latest frame's detections"""
+        with self._encode_lock:
+            with self._cond:
+                seq, detections, records, timestamp = self._seq, self._detections, self._records, self._timestamp
+            if self._json_seq != seq:
+                if records is None:
+                    records = detection_records(detections)
+                self._json = json.dumps({'seq': seq, 'timestamp': timestamp, 'detections': records})
+                self._json_seq = seq
+            return self._json_seq, self._json
+
+    def _viewer(self, chunks, timeout):
+        """Run one viewer's generator of `chunks(seq)` payloads over new frames"""
+        with self._cond:
+            self.viewers += 1
+        try:
+            seq = -1
+            while True:
+                latest = self.wait(seq, timeout)
+                if latest is None:
+                    continue
+                seq, payload = chunks()
+                with self._cond:
+                    self.frames_sent += 1
+                yield payload
+        finally:
+            with self._cond:
+                self.viewers -= 1
+
+    def stream(self, timeout=1.0):
+        """Yield new frames as multipart MJPEG chunks for one viewer"""
+        def chunk():
+            seq, jpeg = self.jpeg()
+            return seq, mjpeg_chunk(jpeg)
+        return self._viewer(chunk, timeout)
+
+    def event_stream(self, timeout=1.0):
+        """Yield the detections of each new frame as server-sent events for one subscriber"""
+        def event():
+            seq, text = self.detections_json()
+            return seq, f"data: {text}\n\n"
+        return self._viewer(event, timeout)
+
+    def stats(self):
+        """Published, encoded and sent frame counters and the number of viewers"""
+        with self._cond:
+            return {
+                'viewers': self.viewers,
+                'frames_published': self.frames_published,
+                'frames_encoded': self.frames_encoded,
+                'frames_sent': self.frames_sent,
+            }
+
+
+def detection_records(detections):
+    """JSON-ready records of a frame's detections (a list of `Detections`), with class names"""
+    records = []
+    for det in detections or []:
+        for record, class_name in zip(det.to_json(), det.class_names()):
+            record['class_name'] = class_name
+            records.append(record)
+    return records
+
+
+def mjpeg_chunk(jpeg):
+    """Wrap JPEG bytes as one part of a multipart/x-mixed-replace stream"""
+    return (b'--frame\r\n'
+            b'Content-Type: image/jpeg\r\n\r\n' + jpeg + b'\r\n')
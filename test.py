@@ -1,6 +1,8 @@
 import cv2
 import time
 from ultralytics import YOLO
+from postprocess import Detections, draw_detections, predict_kwargs
+from frame_gate import MotionGate
 
 # Load models
 model_s = YOLO("./model1.pt")
@@ -21,11 +23,21 @@ CLASS_COLORS = {
 # Confidence threshold
 CONF_THRESHOLD = 0.5
 
+# Filtering arguments pushed down into each model's predict call
+PREDICT_KWARGS_S = predict_kwargs(model_s.names, conf=CONF_THRESHOLD)
+PREDICT_KWARGS_M = predict_kwargs(model_m.names, conf=CONF_THRESHOLD)
+
+# Skip inference when the scene is static or the frame is too blurry
+MOTION_THRESHOLD = 0.005   # Fraction of changed pixels that counts as motion
+BLUR_THRESHOLD = 0.0       # Minimum Laplacian variance, 0 to disable
+gate = MotionGate(motion_threshold=MOTION_THRESHOLD, blur_threshold=BLUR_THRESHOLD)
+
 # Initialize webcam
 cap = cv2.VideoCapture(0, cv2.CAP_DSHOW)
 
 # For FPS calculation
 prev_time = time.time()
+detections = []
 
 while cap.isOpened():
     ret, frame = cap.read()
@@ -35,41 +47,20 @@ while cap.isOpened():
     # Start time for FPS
     current_time = time.time()
 
-    # Inference with both models
-    results_s = model_s(frame)[0]
-    results_m = model_m(frame)[0]
+    # Inference with both models, unless the gate says the last detections still hold
+    if gate.should_infer(frame):
+        results_s = model_s(frame, **PREDICT_KWARGS_S)[0]
+        results_m = model_m(frame, **PREDICT_KWARGS_M)[0]
+
+        # Collect boxes from both models as columnar arrays
+        detections = [Detections.from_results(results) for results in (results_s, results_m)]
 
     # Prepare annotated frame
     annotated_frame = frame.copy()
 
-    # Collect boxes from both models
-    detections = []
-
-    for results, model in [(results_s, model_s), (results_m, model_m)]:
-        for box in results.boxes:
-            if box.conf.item() >= CONF_THRESHOLD:
-                x1, y1, x2, y2 = map(int, box.xyxy[0])
-                conf = float(box.conf)
-                cls = int(box.cls)
-                class_name = model.names[cls]
-                color = CLASS_COLORS.get(class_name, (255, 255, 255))  # Default white
-
-                detections.append({
-                    'box': (x1, y1, x2, y2),
-                    'conf': conf,
-                    'class_name': class_name,
-                    'color': color
-                })
-
     # Draw all detections
     for det in detections:
-        x1, y1, x2, y2 = det['box']
-        label = f"{det['class_name']}: {det['conf']:.2f}"
-        color = det['color']
-
-        cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), color, 2)
-        cv2.putText(annotated_frame, label, (x1, y1 - 10),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
+        draw_detections(annotated_frame, det, CLASS_COLORS)
 
     # Calculate FPS
     fps = 1 / (current_time - prev_time)
@@ -86,4 +77,9 @@ while cap.isOpened():
         break
 
 cap.release()
-cv2.destroyAllWindows()
\ No newline at end of file
+cv2.destroyAllWindows()
+
+stats = gate.stats()
+print(f"Frames: {stats['frames']}, inferred: {stats['inferred']}, "
+      f"skipped static: {stats['skipped_static']}, skipped blurry: {stats['skipped_blurry']}, "
+      f"skip rate: {stats['skip_rate']:.1%}")
\ No newline at end of file
@@ -0,0 +1,201 @@
+import threading
+
+import numpy as np
+
+from postprocess import Detections, box_iou
+
+
+class IoUTracker:
+    """Lightweight multi-object tracker for running the detectors only every few frames
+
+    On detection frames, detections are matched to existing tracks by
+    class-aware IoU and each matched track's per-frame velocity is updated
+    with a simple alpha filter. On the frames in between, `predict()` moves
+    every track along its velocity, so the overlay stays smooth while full
+    inference runs at a fraction of the frame rate. Every object keeps a
+    stable track id for as long as it keeps being matched.
+    """
+
+    def __init__(self, detect_every=5, redetect_conf=0.0, iou_threshold=0.3, max_missed=3,
+                 velocity_alpha=0.5):
+        self.detect_every = max(1, int(detect_every))
+        self.redetect_conf = redetect_conf
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.velocity_alpha = velocity_alpha
+
+        # One row per track
+        self.boxes = np.zeros((0, 4), np.float32)
+        self.velocity = np.zeros((0, 4), np.float32)
+        self.conf = np.zeros(0, np.float32)
+        self.cls = np.zeros(0, np.int64)
+        self.ids = np.zeros(0, np.int64)
+        self.missed = np.zeros(0, np.int64)
+        self.last_seen = np.zeros(0, np.int64)
+
+        # Class names of all models share one id space inside the tracker
+        self.names = {}
+        self._name_ids = {}
+
+        self.frame_index = 0
+        self._last_detection_frame = None
+        self._planned_index = 0
+        self._planned_detection = None
+        self._next_id = 1
+        self._lock = threading.Lock()
+        self.detection_frames = 0
+        self.tracked_frames = 0
+
+    def due(self):
+        """True when the next frame should go through full detection"""
+        if self._planned_index:
+            # Count frames as they are routed, not as their results arrive
+            index, last_detection = self._planned_index, self._planned_detection
+        else:
+            index, last_detection = self.frame_index, self._last_detection_frame
+        if last_detection is None:
+            return True
+        if index + 1 - last_detection >= self.detect_every:
+            return True
+        # Weak tracks are re-detected early instead of being extrapolated
+        return bool(len(self.conf)) and float(self.conf.min()) < self.redetect_conf
+
+    def plan(self, detect):
+        """Record whether the next routed frame goes through detection
+
+        In a pipeline, a frame is routed to detection or tracking before
+        the results of earlier frames reach `update()` or `predict()`.
+        Calling this for every routed frame keeps `due()` from sending
+        several frames in a row to detection while the first is in flight.
+        """
+        with self._lock:
+            self._planned_index += 1
+            if detect:
+                self._planned_detection = self._planned_index
+
+    def _class_ids(self, class_names):
+        ids = []
+        for name in class_names:
+            if name not in self._name_ids:
+                self._name_ids[name] = len(self._name_ids)
+                self.names[self._name_ids[name]] = name
+            ids.append(self._name_ids[name])
+        return np.array(ids, np.int64)
+
+    def update(self, detections_list):
+        """Match a detection frame's results (one `Detections` per model) to the tracks"""
+        with self._lock:
+            self.frame_index += 1
+            self.detection_frames += 1
+            self._last_detection_frame = self.frame_index
+
+            detections_list = [d for d in detections_list if len(d)]
+            if detections_list:
+                boxes = np.concatenate([d.xyxy for d in detections_list]).astype(np.float32)
+                conf = np.concatenate([d.conf for d in detections_list]).astype(np.float32)
+                cls = self._class_ids([name for d in detections_list for name in d.class_names()])
+            else:
+                boxes, conf, cls = np.zeros((0, 4), np.float32), np.zeros(0, np.float32), np.zeros(0, np.int64)
+
+            # Compare detections against where each track is expected to be now
+            predicted = self.boxes + self.velocity * (self.frame_index - self.last_seen)[:, None]
+            score = self._match_scores(predicted, boxes)
+            score[self.cls[:, None] != cls[None, :]] = 0
+
+            matched_tracks, matched_dets = self._greedy_match(score)
+
+            # Matched tracks take the detected box and update their velocity
+            if len(matched_tracks):
+                elapsed = (self.frame_index - self.last_seen[matched_tracks]).clip(1)[:, None]
+                measured = (boxes[matched_dets] - self.boxes[matched_tracks]) / elapsed
+                self.velocity[matched_tracks] = (self.velocity_alpha * measured
+                                                 + (1 - self.velocity_alpha) * self.velocity[matched_tracks])
+                self.boxes[matched_tracks] = boxes[matched_dets]
+                self.conf[matched_tracks] = conf[matched_dets]
+                self.missed[matched_tracks] = 0
+                self.last_seen[matched_tracks] = self.frame_index
+
+            # Unmatched tracks age out
+            unmatched = np.ones(len(self.ids), bool)
+            unmatched[matched_tracks] = False
+            self.missed[unmatched] += 1
+            self._drop(self.missed > self.max_missed)
+
+            # Unmatched detections start new tracks
+            new = np.ones(len(boxes), bool)
+            new[matched_dets] = False
+            count = int(new.sum())
+            if count:
+                self.boxes = np.concatenate([self.boxes, boxes[new]])
+                self.velocity = np.concatenate([self.velocity, np.zeros((count, 4), np.float32)])
+                self.conf = np.concatenate([self.conf, conf[new]])
+                self.cls = np.concatenate([self.cls, cls[new]])
+                self.ids = np.concatenate([self.ids, np.arange(self._next_id, self._next_id + count)])
+                self.missed = np.concatenate([self.missed, np.zeros(count, np.int64)])
+                self.last_seen = np.concatenate([self.last_seen, np.full(count, self.frame_index)])
+                self._next_id += count
+
+            return self._current(self.missed == 0)
+
+    def predict(self):
+        """Propagate the tracks one frame along their velocity, without detection"""
+        with self._lock:
+            self.frame_index += 1
+            self.tracked_frames += 1
+            return self._current(self.missed == 0)
+
+    def _match_scores(self, predicted, boxes):
+        """Score track/detection pairs: IoU matches first, then close centers
+
+        Pairs overlapping by at least `iou_threshold` score above 1. Pairs that
+        don't overlap enough but whose centers are within one box diagonal,
+        as when a fast object has no velocity estimate yet, score in (0, 1).
+        """
+        iou = box_iou(predicted, boxes)
+        centers_t = (predicted[:, :2] + predicted[:, 2:]) / 2
+        centers_d = (boxes[:, :2] + boxes[:, 2:]) / 2
+        distance = np.linalg.norm(centers_t[:, None] - centers_d[None, :], axis=2)
+        diagonal = np.linalg.norm(predicted[:, 2:] - predicted[:, :2], axis=1)[:, None] + 1e-9
+        near = (1 - distance / diagonal).clip(0)
+        return np.where(iou >= self.iou_threshold, 1 + iou, near)
+
+    def _greedy_match(self, score):
+        """Pair tracks and detections by descending score"""
+        if not score.size:
+            return np.zeros(0, np.int64), np.zeros(0, np.int64)
+        candidates = np.argwhere(score > 0)
+        order = np.argsort(-score[candidates[:, 0], candidates[:, 1]])
+        used_tracks, used_dets = set(), set()
+        tracks, dets = [], []
+        for t, d in candidates[order].tolist():
+            if t in used_tracks or d in used_dets:
+                continue
+            used_tracks.add(t)
+            used_dets.add(d)
+            tracks.append(t)
+            dets.append(d)
+        return np.array(tracks, np.int64), np.array(dets, np.int64)
+
+    def _drop(self, mask):
+        keep = ~mask
+        self.boxes, self.velocity = self.boxes[keep], self.velocity[keep]
+        self.conf, self.cls, self.ids = self.conf[keep], self.cls[keep], self.ids[keep]
+        self.missed, self.last_seen = self.missed[keep], self.last_seen[keep]
+
+    def _current(self, mask):
+        """Tracks extrapolated to the current frame as a `Detections` with track ids"""
+        elapsed = (self.frame_index - self.last_seen[mask])[:, None]
+        boxes = self.boxes[mask] + self.velocity[mask] * elapsed
+        return Detections(boxes, self.conf[mask], self.cls[mask], dict(self.names), self.ids[mask])
+
+    def stats(self):
+        with self._lock:
+            frames = self.detection_frames + self.tracked_frames
+            return {
+                'detect_every': self.detect_every,
+                'active_tracks': int(np.count_nonzero(self.missed == 0)),
+                'tracks_created': self._next_id - 1,
+                'detection_frames': self.detection_frames,
+                'tracked_frames': self.tracked_frames,
+                'detection_ratio': self.detection_frames / frames if frames else 0.0,
+            }
@@ -0,0 +1,152 @@
+import argparse
+import json
+import queue
+import sys
+import threading
+import time
+
+import cv2
+
+from backends import BACKENDS, load_model
+from postprocess import Detections, predict_kwargs
+
+# Parse command line arguments
+parser = argparse.ArgumentParser(description='Detect objects in a video file and write NDJSON per frame')
+parser.add_argument('video', type=str, help='Video file to process')
+parser.add_argument('--model', type=str, default='public/models/best.pt', help='Path to the YOLO model')
+parser.add_argument('--backend', type=str, default='pytorch', choices=list(BACKENDS), help='Inference backend')
+parser.add_argument('--conf', type=float, default=0.25, help='Confidence threshold')
+parser.add_argument('--classes', type=str, nargs='+', help='Only report these class names or ids')
+parser.add_argument('--max-det', type=int, default=300, help='Maximum detections per frame')
+parser.add_argument('--stride', type=int, default=1, help='Process every Nth frame')
+parser.add_argument('--batch-size', type=int, default=8, help='Consecutive frames per forward pass')
+parser.add_argument('--output', type=str, default='-', help='NDJSON output file (default: stdout)')
+parser.add_argument('--output-video', type=str, default=None, help='Write the annotated frames to this video')
+
+
+class VideoDetector:
+    """Run the detector over a video file, batching consecutive frames
+
+    A background thread decodes the video into a bounded queue while the
+    model works through earlier frames. Only every `stride`-th frame is
+    decoded; the ones in between are only grabbed, which skips the decode
+    cost. `predict_fn` takes a list of BGR frames and returns one ultralytics
+    `Results` per frame.
+    """
+
+    def __init__(self, predict_fn, stride=1, batch_size=8):
+        self.predict_fn = predict_fn
+        self.stride = max(1, int(stride))
+        self.batch_size = max(1, int(batch_size))
+
+    def _decode(self, cap, frames, stop, counts):
+        index = 0
+        try:
+            while not stop.is_set():
+                if index % self.stride:
+                    ok = cap.grab()
+                else:
+                    ok, frame = cap.read()
+                    if ok:
+                        frames.put((index, frame))
+                if not ok:
+                    break
+                index += 1
+        finally:
+            counts['decoded'] = index
+            frames.put(None)
+
+    def run(self, source, output_video=None):
+        """Yield one record per processed frame, then a summary record
+
+        `source` is a video path or an opened `cv2.VideoCapture`, which is
+        released at the end. Frame records are `{"frame": n, "time": seconds,
+        "detections": [...]}`. If `output_video` is given, the annotated
+        processed frames are written there at the source frame rate divided
+        by the stride.
+        """
+        cap = source if isinstance(source, cv2.VideoCapture) else cv2.VideoCapture(source)
+        if not cap.isOpened():
+            raise ValueError(f"Could not open video {source}")
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+
+        frames = queue.Queue(maxsize=self.batch_size * 2)
+        stop = threading.Event()
+        counts = {}
+        decoder = threading.Thread(target=self._decode, args=(cap, frames, stop, counts), daemon=True)
+        start = time.perf_counter()
+        decoder.start()
+
+        writer = None
+        processed = 0
+        try:
+            done = False
+            while not done:
+                batch = []
+                while len(batch) < self.batch_size:
+                    item = frames.get()
+                    if item is None:
+                        done = True
+                        break
+                    batch.append(item)
+                if not batch:
+                    break
+
+                results = self.predict_fn([frame for _, frame in batch])
+                for (index, frame), result in zip(batch, results):
+                    if output_video:
+                        annotated = result.plot()
+                        if writer is None:
+                            h, w = annotated.shape[:2]
+                            writer = cv2.VideoWriter(output_video, cv2.VideoWriter_fourcc(*'mp4v'),
+                                                     fps / self.stride, (w, h))
+                        writer.write(annotated)
+                    processed += 1
+                    yield {'frame': index, 'time': round(index / fps, 3),
+                           'detections': Detections.from_results(result).to_json()}
+        finally:
+            stop.set()
+            # Unblock the decoder if it is waiting on a full queue
+            while decoder.is_alive():
+                try:
+                    frames.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            cap.release()
+            if writer is not None:
+                writer.release()
+
+        elapsed = time.perf_counter() - start
+        video_seconds = counts.get('decoded', total) / fps
+        yield {
+            'done': True,
+            'frames_decoded': counts.get('decoded', 0),
+            'frames_processed': processed,
+            'stride': self.stride,
+            'video_seconds': round(video_seconds, 3),
+            'elapsed_seconds': round(elapsed, 3),
+            'processed_fps': round(processed / elapsed, 2) if elapsed else 0.0,
+            'realtime_factor': round(video_seconds / elapsed, 2) if elapsed else 0.0,
+        }
+
+
+def run(args):
+    model = load_model(args.model, args.backend)
+    kwargs = predict_kwargs(model.names, conf=args.conf, classes=args.classes, max_det=args.max_det)
+    detector = VideoDetector(lambda frames: model(frames, **kwargs), stride=args.stride, batch_size=args.batch_size)
+
+    out = sys.stdout if args.output == '-' else open(args.output, 'w')
+    try:
+        for record in detector.run(args.video, args.output_video):
+            out.write(json.dumps(record) + '\n')
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    # The last record is the summary; also show it on stderr when stdout is redirected
+    print(f"Processed {record['frames_processed']} of {record['frames_decoded']} frames at "
+          f"{record['processed_fps']} FPS ({record['realtime_factor']}x real time)", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    run(parser.parse_args())
@@ -1,31 +1,40 @@
 import torch
 import numpy as np
+import pandas as pd
 from PIL import Image, ImageDraw
 
+from fusion import DetectionFusion
+from postprocess import Detections
+
 def load_model(path):
     model = torch.hub.load('ultralytics/yolov12', 'custom', path=path, force_reload=True)  # replace with YOLOv12
     model.eval()
     return model
 
-def run_inference_and_combine(image, model1, model2):
+def hub_detections(results):
+    """Convert torch.hub results for one image to a `Detections`"""
+    # xyxy[0] is (N, 6) [x1, y1, x2, y2, conf, cls]
+    data = results.xyxy[0].cpu().numpy()
+    return Detections(data[:, :4], data[:, 4], data[:, 5].astype(np.int64), dict(results.names))
+
+def run_inference_and_combine(image, model1, model2, method='wbf', iou_threshold=0.55, name_map=None):
     results1 = model1(image)
     results2 = model2(image)
 
-    # Convert results to pandas
-    df1 = results1.pandas().xyxy[0]
-    df2 = results2.pandas().xyxy[0]
-
-    # Adjust class names to avoid overlap
-    df2['name'] = df2['name'].apply(lambda x: f"m2_{x}")
+    # Fuse both models' boxes; matching (or mapped) class names become one class
+    fusion = DetectionFusion(method, iou_threshold, name_map)
+    detections = fusion([hub_detections(results1), hub_detections(results2)])
 
-    # Combine both
-    combined_df = df1._append(df2, ignore_index=True)
+    combined_df = pd.DataFrame(detections.xyxy, columns=['xmin', 'ymin', 'xmax', 'ymax'])
+    combined_df['confidence'] = detections.conf
+    combined_df['class'] = detections.cls
+    combined_df['name'] = detections.class_names()
 
     # Draw on image
     img_draw = image.copy()
     draw = ImageDraw.Draw(img_draw)
-    for _, row in combined_df.iterrows():
-        draw.rectangle([row['xmin'], row['ymin'], row['xmax'], row['ymax']], outline='red', width=2)
-        draw.text((row['xmin'], row['ymin'] - 10), row['name'], fill='yellow')
+    for (x1, y1, x2, y2), name in zip(detections.xyxy.tolist(), combined_df['name']):
+        draw.rectangle([x1, y1, x2, y2], outline='red', width=2)
+        draw.text((x1, y1 - 10), name, fill='yellow')
 
     return {"df": combined_df, "image": img_draw}